@@ -1,13 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Optional, TypeVar
 
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import models, schemas
+from . import metrics, models, schemas
+from .cache import cache_call, create_backend
 from .config import settings
 from .database import get_db
 
@@ -30,11 +34,61 @@ def get_password_hash(password: str) -> str:
         while truncated_bytes and (truncated_bytes[-1] & 0x80) and not (truncated_bytes[-1] & 0x40):
             truncated_bytes = truncated_bytes[:-1]
         password_bytes = truncated_bytes
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed.decode('utf-8')
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a different bcrypt cost than settings.bcrypt_rounds."""
+    try:
+        return int(hashed_password.split("$")[2]) != settings.bcrypt_rounds
+    except (IndexError, ValueError):
+        return False
+
+
+# bcrypt releases the GIL while hashing, so a small dedicated thread pool gives
+# real parallelism without sharing the request threadpool.
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+_password_jobs_pending = 0
+PASSWORD_JOBS_PENDING = metrics.Gauge(
+    "auth_password_hash_pending", "Password hash/verify jobs running or queued"
+)
+PASSWORD_JOBS_REJECTED = metrics.Counter(
+    "auth_password_hash_rejected_total", "Password jobs rejected with 503 because the queue was full"
+)
+PASSWORD_JOBS_PENDING.set_function(lambda: _password_jobs_pending)
+
+T = TypeVar("T")
+
+
+async def _run_password_job(fn: Callable[..., T], *args) -> T:
+    """Run a bcrypt call on the password pool; 503 once the queue is full."""
+    global _password_jobs_pending
+    if _password_jobs_pending >= settings.password_hash_workers + settings.password_hash_max_queue:
+        PASSWORD_JOBS_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_jobs_pending -= 1
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
     if expires_delta is None:
         expires_delta = timedelta(minutes=settings.access_token_expire_minutes)
@@ -44,13 +98,62 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     return encoded_jwt
 
 
-def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.email == email).limit(1))
+
+
+# Short-lived cache of authenticated users keyed by token subject, so the common
+# path skips the user lookup. Holds no password hash. Shared across workers only
+# with the redis backend; otherwise other workers see changes after the TTL.
+# CACHE_BACKEND=none turns off the catalog cache only: this one then stays in
+# process, and AUTH_USER_CACHE_TTL_SECONDS=0 is what disables it.
+_principal_cache = create_backend("memory" if settings.cache_backend == "none" else settings.cache_backend)
+_PRINCIPAL_FIELDS = ("id", "email", "full_name", "is_admin")
+
+
+def _principal_key(subject: str) -> str:
+    return f"principal:{subject}"
+
+
+async def _cache_principal(user: models.User) -> None:
+    if settings.auth_user_cache_ttl_seconds <= 0:
+        return
+    value = {field: getattr(user, field) for field in _PRINCIPAL_FIELDS}
+    value["created_at"] = user.created_at.isoformat()
+    await cache_call(
+        _principal_cache,
+        _principal_cache.set,
+        _principal_key(user.email),
+        value,
+        settings.auth_user_cache_ttl_seconds,
+    )
+
+
+async def _cached_principal(subject: str) -> Optional[models.User]:
+    if settings.auth_user_cache_ttl_seconds <= 0:
+        return None
+    value = await cache_call(_principal_cache, _principal_cache.get, _principal_key(subject))
+    if value is None:
+        return None
+    # Detached User carrying the cached columns; reload it before changing it.
+    return models.User(
+        **{field: value[field] for field in _PRINCIPAL_FIELDS},
+        created_at=datetime.fromisoformat(value["created_at"]),
+    )
+
+
+async def invalidate_cached_user(email: str) -> None:
+    """Drop the cached principal for `email`; call after changing or deleting a user."""
+    await cache_call(_principal_cache, _principal_cache.delete, _principal_key(email))
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
 ) -> models.User:
+    """
+    Resolve the bearer token to its user. Served from the principal cache when
+    possible, in which case the returned User is not attached to `db`.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -65,9 +168,13 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = get_user_by_email(db, email=token_data.sub)
+    user = await _cached_principal(token_data.sub)
+    if user is not None:
+        return user
+    user = await get_user_by_email(db, email=token_data.sub)
     if user is None:
         raise credentials_exception
+    await _cache_principal(user)
     return user
 
 
@@ -0,0 +1,277 @@
+"""
+Read-through cache for catalog reads.
+
+Backends store JSON-compatible values. `MemoryCache` is an in-process LRU
+with per-entry TTL; `RedisCache` talks to Redis or any server speaking the
+same protocol (KeyDB, Valkey, Dragonfly, ...). The backend is chosen by
+`settings.cache_backend`.
+
+Listing pages are keyed under a per-category generation number, so
+invalidating a category is a single counter bump rather than a key scan.
+
+Backends are synchronous, so scripts and worker threads can use them
+directly. Async code goes through ProductCache's coroutines or
+cache_call(), which run a backend that does network I/O (`blocking = True`)
+in the threadpool instead of on the event loop.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Protocol
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .images import image_variants
+
+
+class CacheBackend(Protocol):
+    # True when calls do network I/O and must stay off the event loop.
+    blocking: bool
+
+    def get(self, key: str) -> Any | None: ...
+
+    def get_many(self, keys: list[str]) -> list[Any | None]: ...
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None: ...
+
+    def set_many(self, items: dict[str, Any], ttl: int | None = None) -> None: ...
+
+    def delete(self, *keys: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class NullCache:
+    """Backend that stores nothing; every read is a miss."""
+
+    blocking = False
+
+    def get(self, key: str) -> Any | None:
+        return None
+
+    def get_many(self, keys: list[str]) -> list[Any | None]:
+        return [None] * len(keys)
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        pass
+
+    def set_many(self, items: dict[str, Any], ttl: int | None = None) -> None:
+        pass
+
+    def delete(self, *keys: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class MemoryCache:
+    """Thread-safe LRU cache with an optional TTL per entry."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys: list[str]) -> list[Any | None]:
+        return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: dict[str, Any], ttl: int | None = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Backend for Redis or a Redis-compatible server. Requires the `redis` package."""
+
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "shoppy:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Any | None:
+        raw = self._client.get(self._prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def get_many(self, keys: list[str]) -> list[Any | None]:
+        if not keys:
+            return []
+        # One MGET round trip instead of one GET per key.
+        raws = self._client.mget([self._prefix + key for key in keys])
+        return [None if raw is None else json.loads(raw) for raw in raws]
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        self._client.set(self._prefix + key, json.dumps(value), ex=ttl or None)
+
+    def set_many(self, items: dict[str, Any], ttl: int | None = None) -> None:
+        pipeline = self._client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipeline.set(self._prefix + key, json.dumps(value), ex=ttl or None)
+        pipeline.execute()
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._client.delete(*(self._prefix + key for key in keys))
+
+    def clear(self) -> None:
+        # One UNLINK per SCAN batch rather than a DELETE round trip per key.
+        batch = []
+        for key in self._client.scan_iter(match=self._prefix + "*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                self._client.unlink(*batch)
+                batch = []
+        if batch:
+            self._client.unlink(*batch)
+
+
+def create_backend(name: str) -> CacheBackend:
+    if name == "memory":
+        return MemoryCache(max_entries=settings.cache_max_entries)
+    if name == "redis":
+        return RedisCache(settings.cache_url)
+    if name == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {name!r}")
+
+
+async def cache_call(backend: CacheBackend, fn: Callable, *args: Any) -> Any:
+    """Call fn (backend work) from async code, in the threadpool when the backend blocks."""
+    if backend.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+ALL_CATEGORIES = "*"
+
+
+class ProductCache:
+    """Product-specific keys, read-through helpers, and hit/miss counters."""
+
+    def __init__(self, backend: CacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _record(self, value: Any | None) -> Any | None:
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    # --- keys ---
+
+    @staticmethod
+    def product_key(product_id: int) -> str:
+        # Cached products embed image_variants URLs, which a manifest rebuild retires.
+        return f"product:{image_variants.current_version()}:{product_id}"
+
+    @staticmethod
+    def _generation_key(category: str | None) -> str:
+        return f"products:gen:{category or ALL_CATEGORIES}"
+
+    def _generation(self, category: str | None) -> int:
+        key = self._generation_key(category)
+        generation = self.backend.get(key)
+        if generation is None:
+            # Seed from the clock so a lost counter can never reuse an old generation.
+            generation = time.time_ns()
+            self.backend.set(key, generation)
+        return generation
+
+    def _listing_key(self, category: str | None, params: tuple) -> str:
+        generation = self._generation(category)
+        suffix = ":".join("" if p is None else str(p) for p in params)
+        # "page" values hold the serialized body and its ETag; the namespace changes with the value's shape.
+        return f"products:page:{category or ALL_CATEGORIES}:{generation}:{suffix}"
+
+    async def listing_key(self, category: str | None, *params: Any) -> str:
+        return await cache_call(self.backend, self._listing_key, category, params)
+
+    # --- reads ---
+
+    async def get_product(self, product_id: int) -> dict | None:
+        return self._record(await cache_call(self.backend, self.backend.get, self.product_key(product_id)))
+
+    async def set_product(self, product_id: int, value: dict) -> None:
+        await cache_call(self.backend, self.backend.set, self.product_key(product_id), value, self.ttl)
+
+    async def get_products(self, product_ids: list[int]) -> dict[int, dict]:
+        """The cached products among product_ids, fetched in one backend call."""
+        keys = [self.product_key(pid) for pid in product_ids]
+        values = await cache_call(self.backend, self.backend.get_many, keys)
+        return {pid: value for pid, value in zip(product_ids, values) if self._record(value) is not None}
+
+    async def set_products(self, values: dict[int, dict]) -> None:
+        if values:
+            items = {self.product_key(pid): value for pid, value in values.items()}
+            await cache_call(self.backend, self.backend.set_many, items, self.ttl)
+
+    async def get(self, key: str) -> Any | None:
+        return self._record(await cache_call(self.backend, self.backend.get, key))
+
+    async def set(self, key: str, value: Any) -> None:
+        await cache_call(self.backend, self.backend.set, key, value, self.ttl)
+
+    # --- invalidation ---
+
+    def invalidate_products_sync(self, product_ids: Iterable[int], categories: Iterable[str | None]) -> None:
+        """invalidate_products() for scripts and startup code, which have no event loop to protect."""
+        self.backend.delete(*(self.product_key(pid) for pid in product_ids))
+        for category in {ALL_CATEGORIES, *(c for c in categories if c)}:
+            self.backend.set(self._generation_key(category), time.time_ns())
+
+    async def invalidate_products(self, product_ids: Iterable[int], categories: Iterable[str | None]) -> None:
+        """Drop the given products and every listing page that could contain them."""
+        await cache_call(self.backend, self.invalidate_products_sync, list(product_ids), list(categories))
+
+product_cache = ProductCache(create_backend(settings.cache_backend), ttl=settings.cache_ttl_seconds)
@@ -0,0 +1,154 @@
+"""
+Checkout engine: turns a user's cart into an order atomically.
+
+Stock is reserved with one set-based conditional UPDATE
+(`stock = stock - qty WHERE stock >= qty ... RETURNING`), so concurrent
+checkouts can never oversell. Cart and product rows are locked up front in
+product-id order (SELECT ... FOR UPDATE on PostgreSQL) so two checkouts of
+overlapping carts cannot deadlock, and serialization failures, deadlocks and
+SQLite lock timeouts are retried with jittered backoff.
+"""
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .config import settings
+
+
+# SQLSTATEs worth retrying: serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+class CartEmpty(Exception):
+    pass
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids: list[int]):
+        super().__init__(f"Insufficient stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
+@dataclass
+class CheckoutResult:
+    order_id: int
+    product_ids: list[int] = field(default_factory=list)
+    categories: set[str | None] = field(default_factory=set)
+    # Categories of products this order sold out, whose in-stock facet count dropped
+    sold_out_categories: set[str | None] = field(default_factory=set)
+
+
+def is_retryable(exc: DBAPIError) -> bool:
+    orig = exc.orig
+    for candidate in (orig, getattr(orig, "__cause__", None)):
+        code = getattr(candidate, "sqlstate", None) or getattr(candidate, "pgcode", None)
+        if code in RETRYABLE_SQLSTATES:
+            return True
+    return "database is locked" in str(orig)
+
+
+async def _checkout_once(db: AsyncSession, user_id: int, order_in: schemas.OrderCreate) -> CheckoutResult:
+    # Read the cart and lock its rows plus the product rows, in product-id order.
+    lines = (
+        await db.execute(
+            select(
+                models.CartItem.product_id,
+                models.CartItem.quantity,
+                models.Product.price,
+                models.Product.category,
+            )
+            .join(models.Product, models.Product.id == models.CartItem.product_id)
+            .where(models.CartItem.user_id == user_id)
+            .order_by(models.CartItem.product_id)
+            .with_for_update()
+        )
+    ).all()
+    if not lines:
+        raise CartEmpty()
+
+    quantities: dict[int, int] = {}
+    for line in lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+
+    # Reserve stock for every line in one statement; rows without enough stock are not touched.
+    wanted = case(quantities, value=models.Product.id)
+    reserved = (
+        await db.execute(
+            update(models.Product)
+            .where(models.Product.id.in_(quantities), models.Product.stock >= wanted)
+            .values(stock=models.Product.stock - wanted)
+            .returning(models.Product.id, models.Product.price, models.Product.stock)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+    if len(reserved) != len(quantities):
+        short = sorted(set(quantities) - {row.id for row in reserved})
+        raise InsufficientStock(short)
+
+    prices = {row.id: row.price for row in reserved}
+    categories = {line.product_id: line.category for line in lines}
+    total_amount = sum(quantity * prices[product_id] for product_id, quantity in quantities.items())
+    now = datetime.utcnow()
+    order_id = await db.scalar(
+        insert(models.Order)
+        .values(
+            user_id=user_id,
+            status=models.OrderStatus.CONFIRMED,
+            payment_status=models.PaymentStatus.PAID,
+            total_amount=total_amount,
+            shipping_customer_name=order_in.shipping_customer_name,
+            shipping_address=order_in.shipping_address,
+            shipping_phone=order_in.shipping_phone,
+            shipping_email=order_in.shipping_email,
+            created_at=now,
+            updated_at=now,
+        )
+        .returning(models.Order.id)
+    )
+    await db.execute(
+        insert(models.OrderItem),
+        [
+            {
+                "order_id": order_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": prices[product_id],
+                "subtotal": quantity * prices[product_id],
+            }
+            for product_id, quantity in quantities.items()
+        ],
+    )
+    await db.execute(delete(models.CartItem).where(models.CartItem.user_id == user_id))
+    await db.commit()
+    return CheckoutResult(
+        order_id=order_id,
+        product_ids=list(quantities),
+        categories={line.category for line in lines},
+        sold_out_categories={categories[row.id] for row in reserved if row.stock <= 0},
+    )
+
+
+async def checkout_cart(db: AsyncSession, user_id: int, order_in: schemas.OrderCreate) -> CheckoutResult:
+    """
+    Place an order for the user's whole cart. Raises CartEmpty or
+    InsufficientStock (after rolling back) instead of placing a partial order.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await _checkout_once(db, user_id, order_in)
+        except (CartEmpty, InsufficientStock):
+            await db.rollback()
+            raise
+        except DBAPIError as exc:
+            await db.rollback()
+            if attempt >= settings.checkout_max_retries or not is_retryable(exc):
+                raise
+            attempt += 1
+            await asyncio.sleep(random.uniform(0, 0.01 * 2 ** attempt))
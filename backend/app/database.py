@@ -1,25 +1,249 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import importlib.util
+import logging
+import time
+from typing import Any, AsyncIterator, Callable
 
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics
+from .instrumentation import instrument_engine
 from .config import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class Base(DeclarativeBase):
     pass
 
 
+def _is_sqlite(url: str) -> bool:
+    return url.strip().lower().startswith("sqlite")
+
+
+# Dialect-specific INSERT constructs that support ON CONFLICT ... DO UPDATE.
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Cart, checkout, import and rating writes rely on RETURNING and ON CONFLICT
+# upserts, which these backends support and MySQL does not.
+SUPPORTED_BACKENDS = tuple(_UPSERT_INSERTS)
+
+
+def upsert_insert(bind):
+    """The insert() construct with on_conflict_do_update() for the database behind bind (engine or connection)."""
+    return _UPSERT_INSERTS[bind.dialect.name]
+
+
+def check_supported_backend(url: str) -> None:
+    backend = make_url(url).get_backend_name()
+    if backend not in SUPPORTED_BACKENDS:
+        raise RuntimeError(
+            f"Unsupported database backend {backend!r} in DATABASE_URL; use one of: {', '.join(SUPPORTED_BACKENDS)}"
+        )
+
+
+# Async driver to use for each backend when DATABASE_URL names a sync driver.
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str | None:
+    """
+    DATABASE_URL with its async driver, or None when no async driver is known
+    for the backend or the driver package is not installed.
+    """
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or importlib.util.find_spec(driver.split("+")[1]) is None:
+        return None
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+POOL_CHECKOUT_WAIT = metrics.Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["engine"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+POOL_CHECKOUT_TIMEOUTS = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout", ["engine"]
+)
+POOL_IN_USE = metrics.Gauge("db_pool_connections_in_use", "Connections currently checked out", ["engine"])
+POOL_OVERFLOW = metrics.Gauge("db_pool_overflow", "Connections open beyond pool_size", ["engine"])
+POOL_SIZE = metrics.Gauge("db_pool_size", "Configured pool_size", ["engine"])
+POOL_CONNECTS = metrics.Counter("db_pool_connects_total", "New DBAPI connections opened", ["engine"])
+
+
+class _TimedPoolMixin:
+    metrics_label = ""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(engine=self.metrics_label)
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, engine=self.metrics_label)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def _pool_kw(queue_pool_class) -> dict:
+    """Pool arguments from settings. "null" mode opens a connection per checkout (PgBouncer transaction pooling)."""
+    if settings.db_pool_mode == "null":
+        return {"poolclass": NullPool, "pool_pre_ping": settings.db_pool_pre_ping}
+    if settings.db_pool_mode != "queue":
+        raise ValueError(f"Unknown db_pool_mode: {settings.db_pool_mode!r}")
+    return {
+        "poolclass": queue_pool_class,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def _instrument_pool(sync_engine: Engine, label: str) -> None:
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        POOL_CONNECTS.inc(engine=label)
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_IN_USE.inc(engine=label)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        POOL_IN_USE.dec(engine=label)
+
+    # Read through the engine so a pool recreated by dispose() is still reported.
+    if isinstance(sync_engine.pool, QueuePool):
+        POOL_OVERFLOW.set_function(lambda: max(sync_engine.pool.overflow(), 0), engine=label)
+        POOL_SIZE.set_function(lambda: sync_engine.pool.size(), engine=label)
+
+
+
+
+check_supported_backend(settings.database_url)
+
 _engine_kw = {"echo": False, "future": True}
-if settings.database_url.strip().lower().startswith("sqlite"):
+if _is_sqlite(settings.database_url):
     _engine_kw["connect_args"] = {"check_same_thread": False}
 
-engine = create_engine(settings.database_url, **_engine_kw)
+# The sync engine is always available: startup DDL, in-memory index builds,
+# NDJSON streams and scripts use it directly.
+engine = create_engine(settings.database_url, **_engine_kw, **_pool_kw(TimedQueuePool))
+_instrument_pool(engine, "sync")
+instrument_engine(engine, "sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+async_url = None
+if settings.database_async:
+    async_url = settings.async_database_url or to_async_url(settings.database_url)
+    if async_url is None:
+        logger.warning(
+            "No async driver installed for %s; serving requests through the sync engine in the threadpool. "
+            "Install one or set ASYNC_DATABASE_URL.",
+            make_url(settings.database_url).drivername,
+        )
+if async_url is not None:
+    _async_engine_kw = {}
+    if settings.db_pool_mode == "null" and make_url(async_url).get_driver_name() == "asyncpg":
+        # PgBouncer in transaction mode cannot keep prepared statements across transactions.
+        _async_engine_kw["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    async_engine = create_async_engine(
+        async_url, echo=False, **_async_engine_kw, **_pool_kw(TimedAsyncAdaptedQueuePool)
+    )
+    _instrument_pool(async_engine.sync_engine, "async")
+    instrument_engine(async_engine.sync_engine, "async")
+    # Objects stay usable after commit; reloading them lazily would need an await.
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+_ThreadedSessionLocal = sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)
+
+
+class ThreadedSession:
+    """
+    AsyncSession-compatible wrapper around a sync Session.
+    Used when DATABASE_ASYNC is off: each database call runs in the threadpool,
+    so routers keep a single async code path for both modes.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+        self.bind = session.get_bind()
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kw)
 
-def get_db():
-    db = SessionLocal()
+    async def scalar(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kw)
+
+    async def scalars(self, statement, params=None, **kw):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kw)
+
+    async def get(self, entity, ident, **kw):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kw)
+
+    async def delete(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance: Any, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def run_sync(self, fn: Callable, *args, **kw):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kw)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+
+    db = ThreadedSession(_ThreadedSessionLocal())
     try:
         yield db
     finally:
-        db.close()
-
+        await db.close()
@@ -0,0 +1,75 @@
+"""
+Category facets.
+
+category_facets holds one row per category with its product count, in-stock
+count and price range, so the catalog sidebar reads a handful of rows instead
+of aggregating products. Admin product writes, and checkouts that sell a
+product out, refresh just the categories they touched with one GROUP BY.
+Every category is recomputed on startup; schedule a full rebuild to correct
+drift from writes made outside the API:
+
+    python -m backend.app.facets
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import upsert_insert
+
+
+_AGGREGATES = ("product_count", "in_stock_count", "min_price", "max_price", "updated_at")
+
+
+def refresh_facets(db: Session, categories: Iterable[str | None] | None = None) -> int:
+    """
+    Recompute the facets of the given categories, or of every category when
+    categories is None, and commit. Categories left without products lose
+    their row. Returns the number of rows written.
+    """
+    aggregate = (
+        select(
+            models.Product.category,
+            func.count().label("product_count"),
+            func.sum(case((models.Product.stock > 0, 1), else_=0)).label("in_stock_count"),
+            func.min(models.Product.price).label("min_price"),
+            func.max(models.Product.price).label("max_price"),
+        )
+        .where(models.Product.category.is_not(None))
+        .group_by(models.Product.category)
+    )
+    wanted = None
+    if categories is not None:
+        wanted = {category for category in categories if category}
+        if not wanted:
+            return 0
+        aggregate = aggregate.where(models.Product.category.in_(wanted))
+
+    now = datetime.utcnow()
+    rows = [{**row._asdict(), "updated_at": now} for row in db.execute(aggregate)]
+    if rows:
+        insert = upsert_insert(db.get_bind())
+        stmt = insert(models.CategoryFacet).values(rows)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[models.CategoryFacet.category],
+                set_={name: stmt.excluded[name] for name in _AGGREGATES},
+            )
+        )
+
+    found = [row["category"] for row in rows]
+    emptied = delete(models.CategoryFacet).where(models.CategoryFacet.category.not_in(found))
+    if wanted is not None:
+        emptied = emptied.where(models.CategoryFacet.category.in_(wanted))
+    db.execute(emptied)
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        print(f"Rebuilt facets for {refresh_facets(db)} categories")
@@ -0,0 +1,79 @@
+"""
+HTTP validators for catalog reads.
+
+Catalog responses carry a strong ETag, a Last-Modified date when one row's
+updated_at decides the content, and the Cache-Control policy configured for
+the route (settings.http_cache_control). A request whose If-None-Match or
+If-Modified-Since still matches gets an empty 304 instead of the body.
+
+ETags come from products.updated_at for single products and their reviews,
+and from a hash of the serialized body for product listings and facets, so
+they change exactly when the body does, whichever process changed the rows.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+from .config import settings
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over everything that determines a response body."""
+    digest = hashlib.blake2b(":".join(str(part) for part in parts).encode(), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+
+def _http_date(value: datetime) -> str:
+    # Timestamps are stored as naive UTC.
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches.
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _not_modified_since(if_modified_since: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second precision.
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def conditional(
+    request: Request,
+    response: Response,
+    route: str,
+    etag: str,
+    last_modified: datetime | None = None,
+) -> Response | None:
+    """
+    Set the validators and route's Cache-Control on response. Returns a 304
+    response to send instead when the client's copy is still current, else None.
+    If-Modified-Since is only consulted when there is no If-None-Match.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    cache_control = settings.http_cache_control.get(route)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = bool(if_modified_since and last_modified) and _not_modified_since(if_modified_since, last_modified)
+    if fresh:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
@@ -0,0 +1,290 @@
+"""
+Product image variants.
+
+Every image in static/images/products gets resized variants (thumb, card,
+detail) in WebP and JPEG, written to static/images/variants with a hash of
+their content in the file name, so they can be cached forever.
+manifest.json maps each source URL to its variant URLs and is what
+ProductOut.image_variants reads. Build the variants at deploy time with
+
+    python -m backend.app.images [--force]
+
+Admin product writes build them for a new local image on the fly. Building
+needs Pillow (pip install Pillow); without it products just have no variants.
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parent.parent.parent / "static"
+STATIC_URL = "/static"
+SOURCE_DIR = STATIC_DIR / "images" / "products"
+VARIANT_DIR = STATIC_DIR / "images" / "variants"
+VARIANT_URL = f"{STATIC_URL}/images/variants"
+
+SOURCE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+# Longest side in pixels; smaller sources are not upscaled.
+SIZES = {"thumb": 160, "card": 480, "detail": 1200}
+# Output format -> (Pillow format, save options)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Variant files never change under the same name.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# How often a worker checks whether the manifest was rebuilt by another process.
+MANIFEST_CHECK_INTERVAL = 5.0
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _render(image, size: int, pil_format: str, options: dict) -> bytes:
+    variant = image.copy()
+    variant.thumbnail((size, size))
+    if pil_format == "JPEG" and variant.mode not in ("RGB", "L"):
+        variant = variant.convert("RGB")
+    buffer = io.BytesIO()
+    variant.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+class ImageVariants:
+    """The variant manifest, and the builder that keeps it in step with the source images."""
+
+    def __init__(self, source_dir: Path, variant_dir: Path):
+        self.source_dir = source_dir
+        self.variant_dir = variant_dir
+        self.manifest_path = variant_dir / "manifest.json"
+        self._entries: dict[str, dict] = {}
+        self._mtime: int | None = None
+        self._checked_at = float("-inf")
+        self.version = ""
+        self._lock = threading.Lock()
+
+    # --- reads ---
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < MANIFEST_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        raw = self.manifest_path.read_bytes() if mtime is not None else b"{}"
+        self._entries = json.loads(raw)
+        self._mtime = mtime
+        self.version = _digest(raw)
+
+    def current_version(self) -> str:
+        """Hash of the manifest in use; changes whenever any variant URL does."""
+        self._refresh()
+        return self.version
+
+    def urls(self, image_url: str | None) -> dict[str, dict[str, str]] | None:
+        """{size: {format: url}} for a product's image_url, or None without variants."""
+        if not image_url:
+            return None
+        self._refresh()
+        entry = self._entries.get(image_url)
+        return entry["variants"] if entry is not None else None
+
+    # --- builds ---
+
+    def _source_url(self, path: Path) -> str:
+        return f"{STATIC_URL}/{path.relative_to(STATIC_DIR).as_posix()}"
+
+    def _source_path(self, image_url: str) -> Path | None:
+        if not image_url.startswith(f"{STATIC_URL}/"):
+            return None
+        path = (STATIC_DIR / image_url.removeprefix(f"{STATIC_URL}/")).resolve()
+        if path.parent != self.source_dir.resolve() or path.suffix.lower() not in SOURCE_SUFFIXES:
+            return None
+        return path if path.is_file() else None
+
+    def _build_one(self, path: Path, entries: dict[str, dict], force: bool) -> bool:
+        from PIL import Image
+
+        data = path.read_bytes()
+        source_hash = _digest(data)
+        url = self._source_url(path)
+        current = entries.get(url)
+        if current is not None and current["source"] == source_hash and not force:
+            return False
+
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        variants: dict[str, dict[str, str]] = {}
+        written: set[str] = set()
+        for size_name, size in SIZES.items():
+            variants[size_name] = {}
+            for extension, (pil_format, options) in FORMATS.items():
+                output = _render(image, size, pil_format, options)
+                filename = f"{path.stem}-{size_name}-{_digest(output)}.{extension}"
+                target = self.variant_dir / filename
+                if not target.exists():
+                    target.write_bytes(output)
+                written.add(filename)
+                variants[size_name][extension] = f"{VARIANT_URL}/{filename}"
+
+        if current is not None:
+            for formats in current["variants"].values():
+                for old_url in formats.values():
+                    filename = old_url.rsplit("/", 1)[-1]
+                    if filename not in written:
+                        (self.variant_dir / filename).unlink(missing_ok=True)
+        entries[url] = {"source": source_hash, "width": image.width, "height": image.height, "variants": variants}
+        return True
+
+    def _write_manifest(self, entries: dict[str, dict]) -> None:
+        raw = json.dumps(entries, indent=1, sort_keys=True).encode()
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_bytes(raw)
+        os.replace(tmp, self.manifest_path)
+        self._entries = entries
+        self._mtime = self.manifest_path.stat().st_mtime_ns
+        self.version = _digest(raw)
+
+    def build(self, paths: list[Path] | None = None, force: bool = False) -> int:
+        """
+        (Re)build variants for the given source images, or for every image in
+        source_dir, skipping those whose content has not changed. Variants of
+        deleted sources are removed on a full build. Returns how many images
+        were (re)built.
+        """
+        with self._lock:
+            self.variant_dir.mkdir(parents=True, exist_ok=True)
+            self._checked_at = float("-inf")
+            self._refresh()
+            entries = dict(self._entries)
+            full = paths is None
+            if full:
+                paths = sorted(p for p in self.source_dir.iterdir() if p.suffix.lower() in SOURCE_SUFFIXES)
+            built = sum(self._build_one(path, entries, force) for path in paths)
+
+            removed = 0
+            if full:
+                live = {self._source_url(path) for path in paths}
+                for url in [url for url in entries if url not in live]:
+                    for formats in entries.pop(url)["variants"].values():
+                        for variant_url in formats.values():
+                            (self.variant_dir / variant_url.rsplit("/", 1)[-1]).unlink(missing_ok=True)
+                    removed += 1
+            if built or removed:
+                self._write_manifest(entries)
+            return built
+
+    def ensure(self, image_url: str | None) -> bool:
+        """
+        Build variants for a product's image if it is a local source image
+        without current variants. Returns False when there is nothing to
+        build or Pillow is not installed.
+        """
+        path = self._source_path(image_url) if image_url else None
+        if path is None:
+            return False
+        try:
+            return self.build([path]) > 0
+        except ImportError:
+            logger.warning("Pillow is not installed; no variants built for %s", image_url)
+            return False
+
+
+image_variants = ImageVariants(SOURCE_DIR, VARIANT_DIR)
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single "bytes=" range into inclusive (start, end). Returns None
+    for headers to ignore (other units, several ranges, malformed) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:  # suffix range: the last N bytes
+            length = int(last)
+            start, end = (max(size - length, 0) if length else size), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class VariantStaticFiles(StaticFiles):
+    """
+    Serves the content-hashed variant files with a one-year immutable
+    Cache-Control, the ETag/Last-Modified validators of StaticFiles, and
+    single byte-range requests (206 / 416).
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.headers["Accept-Ranges"] = "bytes"
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if response.status_code != 200 or range_header is None:
+            return response
+        # If-Range: only send a part of the representation the client already has.
+        if_range = request_headers.get("if-range")
+        if if_range is not None and if_range != response.headers.get("etag"):
+            return response
+
+        size = stat_result.st_size
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={"Content-Range": f"bytes */{size}", "Cache-Control": IMMUTABLE_CACHE_CONTROL},
+            )
+        if byte_range is None:
+            return response
+        start, end = byte_range
+        with open(full_path, "rb") as file:
+            file.seek(start)
+            body = file.read(end - start + 1)
+        headers = {
+            name: response.headers[name]
+            for name in ("etag", "last-modified", "cache-control", "accept-ranges")
+            if name in response.headers
+        }
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(body, status_code=206, headers=headers, media_type=response.media_type)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build resized WebP/JPEG variants of the product images.")
+    parser.add_argument("--force", action="store_true", help="rebuild images whose source has not changed")
+    args = parser.parse_args()
+    count = image_variants.build(force=args.force)
+    print(f"Built variants for {count} image(s) in {VARIANT_DIR}")
@@ -0,0 +1,217 @@
+"""
+Request-level timing: where a request's time goes.
+
+RequestMetricsMiddleware starts a RequestTimings for every HTTP request and
+keeps it in a context variable. The cursor hooks installed by
+instrument_engine() add each SQL statement's count and duration to it, and
+TimedRoute marks when the endpoint function starts and returns. That splits
+a request into:
+
+    deps       dependency resolution before the endpoint (JWT decode, user lookup, body parsing)
+    handler    the endpoint function itself
+    db         SQL statement time (inside deps and handler)
+    serialize  response_model validation and JSON rendering after the endpoint returns
+
+Per-route histograms of all of these are exported at /metrics. With
+SERVER_TIMING=true the same split is sent in a Server-Timing header, and
+statements slower than SLOW_QUERY_THRESHOLD_MS are logged.
+"""
+import asyncio
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics
+from .config import settings
+
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION = metrics.Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte", ["method", "route", "status"]
+)
+REQUEST_DEPENDENCIES = metrics.Histogram(
+    "http_request_dependencies_seconds", "Time resolving dependencies before the endpoint ran", ["method", "route"]
+)
+REQUEST_SERIALIZATION = metrics.Histogram(
+    "http_request_serialization_seconds", "Time from the endpoint's return to the response start", ["method", "route"]
+)
+REQUEST_DB_TIME = metrics.Histogram("http_request_db_seconds", "SQL time per request", ["method", "route"])
+REQUEST_DB_STATEMENTS = metrics.Histogram(
+    "http_request_db_statements",
+    "SQL statements per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+STATEMENT_DURATION = metrics.Histogram("db_statement_duration_seconds", "SQL statement execution time", ["engine"])
+SLOW_STATEMENTS = metrics.Counter(
+    "db_slow_statements_total", "Statements slower than slow_query_threshold_ms", ["engine"]
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestTimings:
+    __slots__ = ("start", "endpoint_start", "endpoint_end", "db_statements", "db_seconds")
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.endpoint_start: float | None = None
+        self.endpoint_end: float | None = None
+        self.db_statements = 0
+        self.db_seconds = 0.0
+
+    def split(self, response_start: float) -> dict[str, float]:
+        """Seconds spent per phase, for the phases this request went through."""
+        phases = {"total": response_start - self.start, "db": self.db_seconds}
+        if self.endpoint_start is not None:
+            phases["deps"] = self.endpoint_start - self.start
+        if self.endpoint_end is not None:
+            phases["handler"] = self.endpoint_end - self.endpoint_start
+            phases["serialize"] = response_start - self.endpoint_end
+        return phases
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> RequestTimings | None:
+    return _current.get()
+
+
+def _route_label(scope: Scope) -> str:
+    # Route templates (and mount paths) keep label cardinality bounded.
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("root_path") or UNMATCHED_ROUTE
+
+
+def _server_timing(phases: dict[str, float], db_statements: int) -> str:
+    parts = []
+    for name, seconds in phases.items():
+        part = f"{name};dur={seconds * 1000:.2f}"
+        if name == "db":
+            part += f';desc="{db_statements} statements"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = False) -> None:
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status_code = 500
+        phases: dict[str, float] = {}
+
+        async def send_timed(message: Message) -> None:
+            nonlocal status_code, phases
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                phases = timings.split(time.perf_counter())
+                if self.server_timing:
+                    MutableHeaders(raw=message["headers"]).append(
+                        "Server-Timing", _server_timing(phases, timings.db_statements)
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            REQUEST_DURATION.observe(
+                time.perf_counter() - timings.start, method=method, route=route, status=status_code
+            )
+            REQUEST_DB_TIME.observe(timings.db_seconds, method=method, route=route)
+            REQUEST_DB_STATEMENTS.observe(timings.db_statements, method=method, route=route)
+            if "deps" in phases:
+                REQUEST_DEPENDENCIES.observe(phases["deps"], method=method, route=route)
+            if "serialize" in phases:
+                REQUEST_SERIALIZATION.observe(phases["serialize"], method=method, route=route)
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an endpoint to record when it starts and returns. The signature is kept for FastAPI."""
+
+    def started() -> RequestTimings | None:
+        timings = _current.get()
+        if timings is not None:
+            timings.endpoint_start = time.perf_counter()
+        return timings
+
+    def finished(timings: RequestTimings | None) -> None:
+        if timings is not None:
+            timings.endpoint_end = time.perf_counter()
+
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            timings = started()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                finished(timings)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            timings = started()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                finished(timings)
+
+    return timed
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that lets RequestTimings tell dependency, handler and serialization time apart."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+def instrument_engine(sync_engine: Engine, label: str) -> None:
+    """Time every statement on the engine, per request and globally, and log slow ones."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["statement_start"].pop()
+        STATEMENT_DURATION.observe(elapsed, engine=label)
+        timings = _current.get()
+        if timings is not None:
+            timings.db_statements += 1
+            timings.db_seconds += elapsed
+        threshold = settings.slow_query_threshold_ms
+        if threshold and elapsed * 1000 >= threshold:
+            SLOW_STATEMENTS.inc(engine=label)
+            logger.warning(
+                "Slow query (%.1f ms, %s engine%s): %s",
+                elapsed * 1000,
+                label,
+                ", executemany" if executemany else "",
+                " ".join(statement.split())[:2000],
+            )
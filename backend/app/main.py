@@ -1,10 +1,17 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from . import facets, metrics, migrations
+from .compression import CompressionMiddleware
 from .config import settings
-from .database import Base, engine
+from .database import SessionLocal, async_engine, engine
+from .images import VARIANT_DIR, VARIANT_URL, VariantStaticFiles
+from .instrumentation import RequestMetricsMiddleware
+from .pagination import NEXT_CURSOR_HEADER
+from .suggest import name_suggester
 from .routers import admin as admin_router
 from .routers import auth as auth_router
 from .routers import products as products_router
@@ -14,7 +21,8 @@ from .routers import reviews as reviews_router
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Shoppy")
+    # orjson renders response bodies several times faster than the stdlib encoder.
+    app = FastAPI(title="Shoppy", default_response_class=ORJSONResponse)
 
     # CORS
     app.add_middleware(
@@ -23,12 +31,28 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
-    # Static files for product images
+    # Compression
+    if settings.compression_encodings:
+        app.add_middleware(
+            CompressionMiddleware,
+            encodings=settings.compression_encodings,
+            minimum_size=settings.compression_min_size,
+            gzip_level=settings.compression_gzip_level,
+            brotli_quality=settings.compression_brotli_quality,
+        )
+
+    # Request timing; added last so it is outermost and sees the whole request.
+    app.add_middleware(RequestMetricsMiddleware, server_timing=settings.server_timing)
+
+    # Static files for product images; resized variants are content-hashed and cached for good.
     static_dir = Path(__file__).parent.parent.parent / "static"
     static_dir.mkdir(exist_ok=True)
     (static_dir / "images" / "products").mkdir(parents=True, exist_ok=True)
+    VARIANT_DIR.mkdir(parents=True, exist_ok=True)
+    app.mount(VARIANT_URL, VariantStaticFiles(directory=str(VARIANT_DIR)), name="image_variants")
     app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
     # Routers
@@ -39,6 +63,10 @@ def create_app() -> FastAPI:
     app.include_router(reviews_router.router)
     app.include_router(admin_router.router)
 
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
     return app
 
 
@@ -47,4 +75,16 @@ app = create_app()
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        facets.refresh_facets(db)
+        name_suggester.build(db)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if async_engine is not None:
+        await async_engine.dispose()
\ No newline at end of file
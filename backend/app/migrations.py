@@ -0,0 +1,132 @@
+"""
+Schema migrations for existing databases.
+
+create_all() creates missing tables but never changes existing ones, so every
+column, constraint, index and trigger added to a table since it was first
+created is installed here. Each step is idempotent; migrate() runs them all
+on startup, in order:
+
+    python -m backend.app.migrations
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from .cache import product_cache
+from .database import Base
+from .ratings import reconcile_ratings
+
+
+_CART_UNIQUE_INDEX = "uq_cart_items_user_product"
+_UPDATED_AT_TRIGGER = "products_updated_at_default"
+
+_PG_SEARCH_DDL = (
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+)
+
+
+def install_cart_constraints(engine: Engine) -> None:
+    """
+    Add the (user_id, product_id) unique index to an existing cart_items table
+    (idempotent). Duplicate lines left by older versions are merged first.
+    """
+    if _CART_UNIQUE_INDEX in {index["name"] for index in inspect(engine).get_indexes("cart_items")}:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE cart_items SET quantity = ("
+            " SELECT SUM(c.quantity) FROM cart_items c"
+            " WHERE c.user_id = cart_items.user_id AND c.product_id = cart_items.product_id)"
+            " WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+        ))
+        conn.execute(text(
+            "DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)"
+        ))
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {_CART_UNIQUE_INDEX} ON cart_items (user_id, product_id)"
+        ))
+
+
+def install_updated_at(engine: Engine) -> None:
+    """
+    Add products.updated_at to an existing products table, backfilled from
+    created_at, and make rows inserted without it default to their created_at
+    (idempotent).
+    """
+    columns = {column["name"]: column for column in inspect(engine).get_columns("products")}
+    if "updated_at" in columns and not columns["updated_at"]["nullable"]:
+        return
+    with engine.begin() as conn:
+        if "updated_at" not in columns:
+            conn.execute(text("ALTER TABLE products ADD COLUMN updated_at TIMESTAMP"))
+        conn.execute(text("UPDATE products SET updated_at = created_at WHERE updated_at IS NULL"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "ALTER TABLE products ALTER COLUMN updated_at SET DEFAULT (now() AT TIME ZONE 'utc'),"
+                " ALTER COLUMN updated_at SET NOT NULL"
+            ))
+        else:
+            # SQLite cannot make an added column NOT NULL or give it a non-constant default.
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {_UPDATED_AT_TRIGGER} AFTER INSERT ON products"
+                " WHEN NEW.updated_at IS NULL"
+                " BEGIN UPDATE products SET updated_at = NEW.created_at WHERE id = NEW.id; END"
+            ))
+
+
+def install_rating_columns(engine: Engine) -> None:
+    """Add the rating aggregate columns to an existing products table and backfill them (idempotent)."""
+    columns = {column["name"] for column in inspect(engine).get_columns("products")}
+    if {"rating_sum", "rating_count"} <= columns:
+        return
+    with engine.begin() as conn:
+        for name in ("rating_sum", "rating_count"):
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE products ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"))
+    with Session(engine) as db:
+        fixed = reconcile_ratings(db)
+    product_cache.invalidate_products_sync([row.id for row in fixed], {row.category for row in fixed})
+
+
+def create_missing_indexes(bind: Engine) -> None:
+    """create_all() only indexes the tables it creates; add indexes declared since to existing tables."""
+    # checkfirst relies on reflection, which skips expression indexes on SQLite; IF NOT EXISTS does not.
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def install_search(engine: Engine) -> None:
+    """Create the full-text search_vector column and GIN index on PostgreSQL (idempotent)."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in _PG_SEARCH_DDL:
+            conn.execute(text(statement))
+
+
+def migrate(engine: Engine) -> None:
+    """Create missing tables, then bring existing ones up to the current schema."""
+    Base.metadata.create_all(bind=engine)
+    install_cart_constraints(engine)
+    install_updated_at(engine)
+    install_rating_columns(engine)
+    create_missing_indexes(engine)
+    install_search(engine)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    migrate(engine)
+    print(f"Schema is up to date ({engine.dialect.name})")
@@ -7,9 +7,14 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    cast,
+    func,
+    literal_column,
+    text,
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
@@ -66,15 +71,73 @@ class Product(Base):
     price: Mapped[float] = mapped_column(Float, nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(512), nullable=True)
     stock: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Aggregates over rated reviews, maintained by ratings.py
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+    # Last change to the row or to its reviews; validates cached catalog responses (http_cache.py)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
 
     cart_items: Mapped[list["CartItem"]] = relationship("CartItem", back_populates="product")
     order_items: Mapped[list["OrderItem"]] = relationship("OrderItem", back_populates="product")
     reviews: Mapped[list["Review"]] = relationship("Review", back_populates="product")
 
+    __table_args__ = (
+        # Keyset pagination for the newest-first product listing
+        Index("ix_products_created_at_id", "created_at", "id"),
+        # Listing filters and sorts (see routers/products.py), each ending in id for keyset pagination
+        Index("ix_products_category_created_id", "category", "created_at", "id"),
+        Index("ix_products_category_price_id", "category", "price", "id"),
+        Index("ix_products_price_id", "price", "id"),
+        # Partial indexes for in_stock=true: only rows with stock, so sold-out products are never visited
+        Index(
+            "ix_products_in_stock_created_id",
+            "created_at",
+            "id",
+            postgresql_where=text("stock > 0"),
+            sqlite_where=text("stock > 0"),
+        ),
+        Index(
+            "ix_products_in_stock_price_id",
+            "price",
+            "id",
+            postgresql_where=text("stock > 0"),
+            sqlite_where=text("stock > 0"),
+        ),
+    )
+
+
+# Filter matching the partial indexes' predicate. The planner can only use a
+# partial index when the query repeats it with a literal 0, not a bound parameter.
+PRODUCT_IN_STOCK = Product.stock > literal_column("0")
+
+# Mean star rating with unrated products as 0, for the "rating" sort. Written
+# with literals so queries render exactly the indexed expression.
+PRODUCT_AVERAGE_RATING = func.coalesce(
+    cast(Product.rating_sum, Float).op("/")(func.nullif(Product.rating_count, literal_column("0"))),
+    literal_column("0"),
+)
+Index("ix_products_rating_id", PRODUCT_AVERAGE_RATING, Product.id)
+
+
+class CategoryFacet(Base):
+    """Per-category product aggregates, maintained by facets.py so the catalog sidebar never scans products."""
+    __tablename__ = "category_facets"
+
+    category: Mapped[str] = mapped_column(String(100), primary_key=True)
+    product_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    in_stock_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    min_price: Mapped[float | None] = mapped_column(Float, nullable=True)
+    max_price: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    # One row per (user, product); cart upserts use it as their ON CONFLICT target.
+    __table_args__ = (Index("uq_cart_items_user_product", "user_id", "product_id", unique=True),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
@@ -106,6 +169,16 @@ class Order(Base):
     user: Mapped["User"] = relationship("User", back_populates="orders")
     items: Mapped[list["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Order history: a user's orders newest first (scanned backwards), all or for some statuses.
+        # The status index also answers the per-status counts without touching the table.
+        Index("ix_orders_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_orders_user_status_created_id", "user_id", "status", "created_at", "id"),
+        # Admin listing and export across users, by date and optionally status.
+        Index("ix_orders_created_id", "created_at", "id"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -123,6 +196,11 @@ class OrderItem(Base):
 
 class Review(Base):
     __tablename__ = "reviews"
+    # Keyset pagination per product: newest first, and by rating (also serves the rating filter and histogram).
+    __table_args__ = (
+        Index("ix_reviews_product_created_id", "product_id", "created_at", "id"),
+        Index("ix_reviews_product_rating_created_id", "product_id", "rating", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
@@ -0,0 +1,66 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException, status
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def _object_hook(obj: dict) -> Any:
+    if "$dt" in obj:
+        return datetime.fromisoformat(obj["$dt"])
+    return obj
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row on a page into an opaque, URL-safe token."""
+    raw = json.dumps(list(values), default=_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> list:
+    """Unpack a token produced by encode_cursor. Raises 400 if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")), object_hook=_object_hook)
+    except (ValueError, binascii.Error, UnicodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+# Cursor integers are bound as SQL BIGINT parameters.
+_MAX_INT = 2**63 - 1
+
+
+def _cursor_value_ok(value: Any, expected: type | tuple[type, ...]) -> bool:
+    if isinstance(value, bool) or not isinstance(value, expected):
+        return False
+    if isinstance(value, int):
+        return -_MAX_INT <= value <= _MAX_INT
+    if isinstance(value, datetime):
+        # Timestamps are stored as naive UTC, and encode_cursor writes them that way.
+        return value.tzinfo is None
+    return True
+
+
+def decode_typed_cursor(token: str, *types: type | tuple[type, ...]) -> list:
+    """
+    decode_cursor for a cursor whose values must have the given types, so a
+    tampered cursor gets a 400 instead of reaching the database.
+    """
+    values = decode_cursor(token, len(types))
+    if not all(_cursor_value_ok(value, expected) for value, expected in zip(values, types)):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
@@ -0,0 +1,245 @@
+"""
+Streaming product import.
+
+NDJSON or CSV request bodies are decoded and parsed incrementally and
+written in chunks. Each chunk costs one lookup of existing names, one
+multi-row INSERT ... RETURNING and one executemany UPDATE, and commits on
+its own, so a large catalog is never held in memory or in one transaction.
+Rows that fail validation are reported by line number and skipped.
+"""
+import codecs
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import metrics, models, schemas
+
+
+IMPORT_ROWS = metrics.Counter("product_import_rows_total", "Rows processed by product imports", ["result"])
+IMPORTS_IN_PROGRESS = metrics.Gauge("product_imports_in_progress", "Product imports currently running")
+
+# Errors listed in the summary; further failures are only counted.
+MAX_REPORTED_ERRORS = 100
+
+# (line number, parsed fields or None, error message or None)
+ParsedRow = tuple[int, dict | None, str | None]
+OnWritten = Callable[[list[models.Product], set[str | None]], Awaitable[None]]
+
+
+_IMPORT_COLUMNS = (
+    models.Product.name,
+    models.Product.description,
+    models.Product.category,
+    models.Product.price,
+    models.Product.image_url,
+    models.Product.stock,
+)
+
+
+def product_values(product_in: schemas.ProductCreate) -> dict:
+    """Column values for a products row."""
+    return {
+        "name": product_in.name,
+        "description": product_in.description,
+        "category": product_in.category.value if product_in.category else None,
+        "price": product_in.price,
+        "image_url": product_in.image_url,
+        "stock": product_in.stock,
+    }
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a UTF-8 byte stream into lines without buffering more than one partial line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.removesuffix("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.removesuffix("\r")
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(fields, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, fields, None
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[ParsedRow]:
+    """CSV with a header row. Empty cells are treated as missing, so field defaults apply."""
+    header: list[str] | None = None
+    record: list[str] = []
+    line_no = start = 0
+    async for line in lines:
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line)
+        text = "\n".join(record)
+        # Quotes are escaped by doubling, so an odd count means a quoted field continues on the next line.
+        if text.count('"') % 2:
+            continue
+        record = []
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start, {name: value for name, value in zip(header, values) if value != ""}, None
+    if record:
+        yield start, None, "Unterminated quoted field"
+
+
+def parse_rows(chunks: AsyncIterator[bytes], input_format: str) -> AsyncIterator[ParsedRow]:
+    parser = iter_csv if input_format == "csv" else iter_ndjson
+    return parser(iter_lines(chunks))
+
+
+def _add_error(summary: schemas.ProductImportSummary, line: int, message: str) -> None:
+    summary.failed += 1
+    IMPORT_ROWS.inc(result="failed")
+    if len(summary.errors) < MAX_REPORTED_ERRORS:
+        summary.errors.append(schemas.ProductImportError(line=line, error=message))
+    else:
+        summary.errors_truncated = True
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+    )
+
+
+async def _write_chunk(
+    db: AsyncSession,
+    chunk: list[tuple[int, dict]],
+    upsert: bool,
+    summary: schemas.ProductImportSummary,
+    on_written: OnWritten | None,
+) -> None:
+    summary.chunks += 1
+    inserts: list[tuple[int, dict]] = chunk
+    updates: list[tuple[int, dict]] = []
+    previous_categories: set[str | None] = set()
+    superseded = 0
+
+    if upsert:
+        # The last row for a name wins, within a chunk as across chunks.
+        latest: dict[str, tuple[int, dict]] = {}
+        for line, values in chunk:
+            latest[values["name"]] = (line, values)
+        superseded = len(chunk) - len(latest)
+
+        existing: dict[str, list] = defaultdict(list)
+        rows = await db.execute(
+            select(models.Product.id, models.Product.name, models.Product.category).where(
+                models.Product.name.in_(latest)
+            )
+        )
+        for row in rows:
+            existing[row.name].append(row)
+
+        inserts = []
+        for name, (line, values) in latest.items():
+            matches = existing.get(name)
+            if not matches:
+                inserts.append((line, values))
+            elif len(matches) > 1:
+                _add_error(summary, line, f"Name matches {len(matches)} existing products")
+            else:
+                updates.append((line, {"id": matches[0].id, **values}))
+                previous_categories.add(matches[0].category)
+
+    now = datetime.utcnow()
+    try:
+        inserted = []
+        if inserts:
+            # Return the written values instead of matching ids to parameter order: asking for
+            # that order makes SQLAlchemy fall back to one INSERT per row on SQLite.
+            inserted = (
+                await db.execute(
+                    insert(models.Product).returning(models.Product.id, *_IMPORT_COLUMNS),
+                    [{**values, "created_at": now} for _, values in inserts],
+                )
+            ).all()
+        if updates:
+            await db.execute(update(models.Product), [values for _, values in updates])
+        await db.commit()
+    except DBAPIError as exc:
+        await db.rollback()
+        for line, _ in inserts + updates:
+            _add_error(summary, line, f"Chunk rolled back: {exc.orig}")
+        return
+
+    summary.inserted += len(inserts)
+    summary.updated += len(updates) + superseded
+    IMPORT_ROWS.inc(len(inserts), result="inserted")
+    IMPORT_ROWS.inc(len(updates) + superseded, result="updated")
+    if on_written is not None:
+        written = [models.Product(**row._mapping) for row in inserted]
+        written += [models.Product(**values) for _, values in updates]
+        await on_written(written, previous_categories)
+
+
+async def import_products(
+    db: AsyncSession,
+    rows: AsyncIterator[ParsedRow],
+    upsert: bool = True,
+    chunk_size: int = 1000,
+    on_written: OnWritten | None = None,
+) -> schemas.ProductImportSummary:
+    """
+    Validate and write parsed rows chunk by chunk. With upsert, a row whose
+    name matches exactly one existing product updates it instead of inserting.
+    on_written receives detached copies of each committed chunk's products
+    and the categories they had before the import.
+    """
+    summary = schemas.ProductImportSummary()
+    chunk: list[tuple[int, dict]] = []
+    count = 0
+    IMPORTS_IN_PROGRESS.inc()
+    try:
+        async for line, fields, error in rows:
+            count += 1
+            if error is None:
+                try:
+                    chunk.append((line, product_values(schemas.ProductCreate.model_validate(fields))))
+                except ValidationError as exc:
+                    error = _validation_message(exc)
+            if error is not None:
+                _add_error(summary, line, error)
+                continue
+            if len(chunk) >= chunk_size:
+                await _write_chunk(db, chunk, upsert, summary, on_written)
+                chunk = []
+        if chunk:
+            await _write_chunk(db, chunk, upsert, summary, on_written)
+    finally:
+        summary.rows = count
+        IMPORTS_IN_PROGRESS.dec()
+    return summary
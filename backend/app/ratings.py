@@ -0,0 +1,139 @@
+"""
+Denormalized product rating aggregates.
+
+products.rating_sum and products.rating_count are kept up to date by the
+review endpoints with one atomic UPDATE per change, so product reads never
+scan reviews. Reviews without a rating (legacy rows) are not counted.
+reconcile_ratings() recomputes every product from one GROUP BY over reviews
+and fixes any drift; run it from the admin API or with
+
+    python -m backend.app.ratings
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import product_cache
+
+
+async def apply_rating_change(
+    db: AsyncSession,
+    product_id: int,
+    old_rating: int | None,
+    new_rating: int | None,
+) -> str | None:
+    """
+    Move a product's aggregates from old_rating to new_rating (None = no rating)
+    inside the caller's transaction; the UPDATE also bumps updated_at. Returns
+    the product's category so the caller can invalidate cached reads once it
+    has committed.
+    """
+    return await db.scalar(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(
+            rating_sum=models.Product.rating_sum + ((new_rating or 0) - (old_rating or 0)),
+            rating_count=models.Product.rating_count + ((new_rating is not None) - (old_rating is not None)),
+        )
+        .returning(models.Product.category)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _rating_totals(*review_criteria):
+    """Per-product rating sum and count over the matching reviews, as one GROUP BY subquery."""
+    return (
+        select(
+            models.Review.product_id,
+            func.sum(models.Review.rating).label("rating_sum"),
+            func.count(models.Review.rating).label("rating_count"),
+        )
+        .where(models.Review.rating.is_not(None), *review_criteria)
+        .group_by(models.Review.product_id)
+        .subquery()
+    )
+
+
+async def remove_ratings(db: AsyncSession, *review_criteria) -> list:
+    """
+    Take the matching reviews out of their products' aggregates, in the caller's
+    transaction and before the reviews are deleted in bulk. Returns the
+    (id, category) rows of the products touched.
+    """
+    totals = _rating_totals(*review_criteria)
+    return (
+        await db.execute(
+            update(models.Product)
+            .where(models.Product.id == totals.c.product_id)
+            .values(
+                rating_sum=models.Product.rating_sum - totals.c.rating_sum,
+                rating_count=models.Product.rating_count - totals.c.rating_count,
+            )
+            .returning(models.Product.id, models.Product.category)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+
+
+async def touch_reviewed_products(db: AsyncSession, *review_criteria) -> list:
+    """
+    Bump updated_at on the products that have matching reviews, for changes that
+    alter how those reviews render (e.g. the author was renamed). Returns the
+    (id, category) rows of the products touched.
+    """
+    return (
+        await db.execute(
+            update(models.Product)
+            .where(models.Product.id.in_(select(models.Review.product_id).where(*review_criteria)))
+            .values(updated_at=datetime.utcnow())
+            .returning(models.Product.id, models.Product.category)
+            .execution_options(synchronize_session=False)
+        )
+    ).all()
+
+
+def reconcile_ratings(db: Session) -> list:
+    """
+    Recompute every product's aggregates from reviews. Returns the (id,
+    category) rows of the products corrected, whose cached reads the caller
+    drops.
+    """
+    totals = _rating_totals()
+    fixed = db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id == totals.c.product_id,
+            (models.Product.rating_sum != totals.c.rating_sum)
+            | (models.Product.rating_count != totals.c.rating_count),
+        )
+        .values(rating_sum=totals.c.rating_sum, rating_count=totals.c.rating_count)
+        .returning(models.Product.id, models.Product.category)
+        .execution_options(synchronize_session=False)
+    ).all()
+    # Products whose last rated review is gone.
+    fixed += db.execute(
+        update(models.Product)
+        .where(
+            models.Product.rating_count != 0,
+            models.Product.id.not_in(select(totals.c.product_id)),
+        )
+        .values(rating_sum=0, rating_count=0)
+        .returning(models.Product.id, models.Product.category)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return fixed
+
+
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        fixed = reconcile_ratings(db)
+    product_cache.invalidate_products_sync([row.id for row in fixed], {row.category for row in fixed})
+    print(f"Corrected rating aggregates for {len(fixed)} product(s)")
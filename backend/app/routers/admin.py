@@ -1,18 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime, timezone
 
-from .. import auth, models, schemas
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+
+from .. import auth, facets, models, order_export, product_import, ratings, schemas
+from ..cache import product_cache
 from ..database import get_db
+from ..images import image_variants
+from ..instrumentation import TimedRoute
+from ..pagination import NEXT_CURSOR_HEADER, decode_typed_cursor, encode_cursor
+from ..search import product_index
+from ..suggest import name_suggester
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=TimedRoute)
+
+
+def _reindex_products(products: list[models.Product]) -> None:
+    for product in products:
+        product_index.upsert(product)
+        name_suggester.upsert(product)
+
+
+async def _invalidate_products(products: list[models.Product], previous_categories=()) -> set[str | None]:
+    """Drop cached reads of the products and of their categories; returns the categories touched."""
+    categories = {p.category for p in products} | set(previous_categories)
+    await product_cache.invalidate_products([p.id for p in products], categories)
+    return categories
 
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+async def _products_changed(products: list[models.Product], previous_categories=()) -> None:
+    """Refresh the catalog indexes and drop cached reads after products were created or updated."""
+    _reindex_products(products)
+    await _invalidate_products(products, previous_categories)
+
+
+async def _build_image_variants(image_urls) -> None:
+    """Resize new local product images into their variants, off the event loop."""
+    for image_url in set(image_urls):
+        await run_in_threadpool(image_variants.ensure, image_url)
+
+
+# Imports writing more products than this rebuild the in-memory indexes once instead of patching them per product.
+INDEX_REBUILD_THRESHOLD = 1000
+
+
+async def _product_deleted(product_id: int, category: str | None) -> None:
+    product_index.remove(product_id)
+    name_suggester.remove(product_id)
+    await product_cache.invalidate_products([product_id], [category])
 
 
 @router.post("/products", response_model=schemas.ProductOut, status_code=status.HTTP_201_CREATED)
-def create_product(
+async def create_product(
     product_in: schemas.ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(auth.get_current_admin_user),
 ):
     """
@@ -27,55 +73,103 @@ def create_product(
         stock=product_in.stock,
     )
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
+    await _build_image_variants([product.image_url])
+    await _products_changed([product])
+    await db.run_sync(facets.refresh_facets, [product.category])
     return product
 
 
 @router.post("/products/bulk", response_model=List[schemas.ProductOut], status_code=status.HTTP_201_CREATED)
-def create_products_bulk(
+async def create_products_bulk(
     products_in: List[schemas.ProductCreate],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(auth.get_current_admin_user),
 ):
     """
     Create multiple products at once. Requires admin authentication.
     Useful for seeding the database with sample products.
     """
-    products = []
-    for product_in in products_in:
-        product = models.Product(
-            name=product_in.name,
-            description=product_in.description,
-            category=product_in.category.value if product_in.category else None,
-            price=product_in.price,
-            image_url=product_in.image_url,
-            stock=product_in.stock,
+    if not products_in:
+        return []
+    products = (
+        await db.scalars(
+            insert(models.Product).returning(models.Product, sort_by_parameter_order=True),
+            [product_import.product_values(product_in) for product_in in products_in],
         )
-        db.add(product)
-        products.append(product)
-    
-    db.commit()
-    for product in products:
-        db.refresh(product)
-    
+    ).all()
+    await db.commit()
+    await _build_image_variants(p.image_url for p in products)
+    await _products_changed(products)
+    await db.run_sync(facets.refresh_facets, {p.category for p in products})
+
     return products
 
 
+@router.post("/products/import", response_model=schemas.ProductImportSummary)
+async def import_products(
+    request: Request,
+    input_format: Optional[Literal["ndjson", "csv"]] = Query(None, alias="format"),
+    upsert: bool = True,
+    chunk_size: int = Query(1000, ge=1, le=5000),
+    db: AsyncSession = Depends(get_db),
+    current_admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    Import products from an NDJSON or CSV request body. Requires admin authentication.
+    The body is parsed as it arrives and written in chunks of chunk_size rows,
+    each committed on its own. With upsert (default), a row whose name matches an
+    existing product updates it. Invalid rows are skipped and listed by line number.
+    The format defaults to CSV for text/csv bodies and NDJSON otherwise.
+    """
+    if input_format is None:
+        input_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    to_index: list[models.Product] | None = []
+    touched_categories: set[str | None] = set()
+
+    async def on_written(products: list[models.Product], previous_categories: set[str | None]) -> None:
+        nonlocal to_index
+        touched_categories.update(await _invalidate_products(products, previous_categories))
+        if to_index is not None:
+            to_index.extend(products)
+            if len(to_index) > INDEX_REBUILD_THRESHOLD:
+                to_index = None
+
+    summary = await product_import.import_products(
+        db,
+        product_import.parse_rows(request.stream(), input_format),
+        upsert=upsert,
+        chunk_size=chunk_size,
+        on_written=on_written,
+    )
+
+    if to_index is None:
+        for index in (product_index, name_suggester):
+            if index.built:
+                await db.run_sync(index.build)
+    else:
+        _reindex_products(to_index)
+    await db.run_sync(facets.refresh_facets, touched_categories)
+    return summary
+
+
 @router.put("/products/{product_id}", response_model=schemas.ProductOut)
-def update_product(
+async def update_product(
     product_id: int,
     product_in: schemas.ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(auth.get_current_admin_user),
 ):
     """
     Update an existing product. Requires admin authentication.
     """
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
+    previous_category = product.category
     product.name = product_in.name
     product.description = product_in.description
     product.category = product_in.category.value if product_in.category else None
@@ -83,24 +177,151 @@ def update_product(
     product.image_url = product_in.image_url
     product.stock = product_in.stock
     
-    db.commit()
-    db.refresh(product)
+    await db.commit()
+    await db.refresh(product)
+    await _build_image_variants([product.image_url])
+    await _products_changed([product], [previous_category])
+    await db.run_sync(facets.refresh_facets, [product.category, previous_category])
     return product
 
 
 @router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(auth.get_current_admin_user),
 ):
     """
     Delete a product. Requires admin authentication.
     """
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    db.delete(product)
-    db.commit()
+    category = product.category
+    await db.delete(product)
+    await db.commit()
+    await _product_deleted(product_id, category)
+    await db.run_sync(facets.refresh_facets, [category])
     return None
+
+
+@router.post("/ratings/reconcile")
+async def reconcile_ratings(
+    db: AsyncSession = Depends(get_db),
+    current_admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    Recompute every product's rating aggregates from reviews. Requires admin authentication.
+    Returns how many products had drifted and were corrected.
+    """
+    fixed = await db.run_sync(ratings.reconcile_ratings)
+    if fixed:
+        await product_cache.invalidate_products([row.id for row in fixed], {row.category for row in fixed})
+    return {"corrected": len(fixed)}
+
+
+@router.post("/facets/rebuild")
+async def rebuild_facets(
+    db: AsyncSession = Depends(get_db),
+    current_admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    Recompute every category's facets from one GROUP BY over products. Requires admin authentication.
+    Returns how many categories have products.
+    """
+    return {"categories": await db.run_sync(facets.refresh_facets)}
+
+
+@router.get("/cache/stats")
+async def cache_stats(current_admin: models.User = Depends(auth.get_current_admin_user)):
+    """
+    Product cache hit/miss counters. Requires admin authentication.
+    """
+    return product_cache.stats()
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Timestamps are stored as naive UTC; convert any explicit offset first.
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def order_filters(
+    status_filter: Optional[List[models.OrderStatus]] = Query(
+        None, alias="status", description="Only orders in these statuses (repeat for several)"
+    ),
+    payment_status: Optional[List[models.PaymentStatus]] = Query(
+        None, description="Only orders with these payment statuses (repeat for several)"
+    ),
+    created_from: Optional[datetime] = Query(None, description="Placed at or after this time (UTC unless an offset is given)"),
+    created_to: Optional[datetime] = Query(None, description="Placed before this time"),
+    user_id: Optional[int] = Query(None, description="Only this user's orders"),
+) -> list:
+    """WHERE criteria shared by the admin order listing and export."""
+    criteria = []
+    if status_filter:
+        criteria.append(models.Order.status.in_(status_filter))
+    if payment_status:
+        criteria.append(models.Order.payment_status.in_(payment_status))
+    if created_from is not None:
+        criteria.append(models.Order.created_at >= _naive_utc(created_from))
+    if created_to is not None:
+        criteria.append(models.Order.created_at < _naive_utc(created_to))
+    if user_id is not None:
+        criteria.append(models.Order.user_id == user_id)
+    return criteria
+
+
+@router.get("/orders", response_model=List[schemas.AdminOrderSummary])
+async def list_all_orders(
+    response: Response,
+    criteria: list = Depends(order_filters),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of orders to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db),
+    current_admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    List orders across all users, newest first. Requires admin authentication.
+    Filter by status, payment status, user and a created_at range. Keyset
+    pagination on (created_at, id); the cursor for the next page is returned
+    in the X-Next-Cursor header.
+    """
+    stmt = select(models.Order).where(*criteria)
+    if cursor is not None:
+        created_at, order_id = decode_typed_cursor(cursor, datetime, int)
+        stmt = stmt.where(tuple_(models.Order.created_at, models.Order.id) < tuple_(created_at, order_id))
+    stmt = stmt.order_by(models.Order.created_at.desc(), models.Order.id.desc())
+
+    orders = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return [schemas.AdminOrderSummary.model_validate(o) for o in orders]
+
+
+@router.get("/orders/export")
+async def export_orders(
+    output_format: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    criteria: list = Depends(order_filters),
+    current_admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    Stream every order matching the filters, with its items, as CSV (one row
+    per item) or NDJSON (one order per line). Requires admin authentication.
+    Rows are read through a server-side cursor, oldest order first, so the
+    export runs in constant memory however many orders match.
+    """
+    if output_format == "csv":
+        body, media_type = order_export.iter_csv(criteria), "text/csv"
+    else:
+        body, media_type = order_export.iter_ndjson(criteria), "application/x-ndjson"
+    filename = f"orders-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{output_format}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,22 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import auth, models, schemas
+from .. import auth, models, ratings, schemas
+from ..cache import product_cache
 from ..database import get_db
+from ..instrumentation import TimedRoute
 
 
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=TimedRoute)
 
 
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = auth.get_user_by_email(db, email=user_in.email)
+async def register_user(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await auth.get_user_by_email(db, email=user_in.email)
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered. Please use a different email")
 
     try:
-        hashed_password = auth.get_password_hash(user_in.password)
+        hashed_password = await auth.get_password_hash_async(user_in.password)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,28 +32,32 @@ def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/login", response_model=schemas.Token)
-def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
-    user = auth.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    user = await auth.get_user_by_email(db, email=form_data.username)
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password. Please try again",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if auth.password_needs_rehash(user.hashed_password):
+        # Cost factor changed since this hash was made; upgrade it now that we have the password.
+        user.hashed_password = await auth.get_password_hash_async(form_data.password)
+        await db.commit()
     access_token = auth.create_access_token(subject=user.email)
     return schemas.Token(access_token=access_token)
 
 
 @router.post("/logout")
-def logout():
+async def logout():
     # Stateless JWT: client should discard the token.
     return {"detail": "Logged out (client-side token invalidation)."}
 
@@ -61,50 +68,69 @@ async def read_users_me(current_user: models.User = Depends(auth.get_current_act
 
 
 @router.patch("/me", response_model=schemas.UserOut)
-def update_users_me(
+async def update_users_me(
     user_in: schemas.UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     """Update current user's full_name, email, and/or password. Only provided fields are updated."""
+    # current_user may be a cached, detached copy; change the persistent row instead.
+    user = await db.get(models.User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    previous_email = user.email
+    previous_name = user.full_name or user.email
+
     if user_in.email is not None:
-        existing = auth.get_user_by_email(db, email=user_in.email)
-        if existing and existing.id != current_user.id:
+        existing = await auth.get_user_by_email(db, email=user_in.email)
+        if existing and existing.id != user.id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered. Please use a different email.",
             )
-        current_user.email = user_in.email
+        user.email = user_in.email
 
     if user_in.full_name is not None:
-        current_user.full_name = user_in.full_name
+        user.full_name = user_in.full_name
 
     if user_in.password is not None and user_in.password != "":
         try:
-            current_user.hashed_password = auth.get_password_hash(user_in.password)
+            user.hashed_password = await auth.get_password_hash_async(user_in.password)
         except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e),
             )
 
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    touched = []
+    if (user.full_name or user.email) != previous_name:
+        # Reviews show the author's name; revalidate the products they appear on.
+        touched = await ratings.touch_reviewed_products(db, models.Review.user_id == user.id)
+    await db.commit()
+    await auth.invalidate_cached_user(previous_email)
+    if touched:
+        await product_cache.invalidate_products([row.id for row in touched], {row.category for row in touched})
+    await db.refresh(user)
+    return user
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
-def delete_account(
-    db: Session = Depends(get_db),
+async def delete_account(
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     """Delete the current user's account and all related data (cart, orders, reviews)."""
     user_id = current_user.id
-    db.query(models.CartItem).filter(models.CartItem.user_id == user_id).delete()
-    for order in db.query(models.Order).filter(models.Order.user_id == user_id).all():
-        db.delete(order)
-    db.query(models.Review).filter(models.Review.user_id == user_id).delete()
-    db.delete(current_user)
-    db.commit()
+    user_orders = select(models.Order.id).where(models.Order.user_id == user_id)
+    await db.execute(delete(models.CartItem).where(models.CartItem.user_id == user_id))
+    await db.execute(delete(models.OrderItem).where(models.OrderItem.order_id.in_(user_orders)))
+    await db.execute(delete(models.Order).where(models.Order.user_id == user_id))
+    rated = await ratings.remove_ratings(db, models.Review.user_id == user_id)
+    await db.execute(delete(models.Review).where(models.Review.user_id == user_id))
+    await db.execute(delete(models.User).where(models.User.id == user_id))
+    await db.commit()
+    await auth.invalidate_cached_user(current_user.email)
+    if rated:
+        await product_cache.invalidate_products([row.id for row in rated], {row.category for row in rated})
     return None
 
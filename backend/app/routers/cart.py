@@ -1,38 +1,71 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import auth, models, schemas
-from ..database import get_db
+from ..database import get_db, upsert_insert
+from ..instrumentation import TimedRoute
 
 
-router = APIRouter(prefix="/cart", tags=["cart"])
+router = APIRouter(prefix="/cart", tags=["cart"], route_class=TimedRoute)
 
 
-@router.get("", response_model=schemas.CartOut)
-def get_cart(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
-):
-    items = (
-        db.query(models.CartItem)
-        .join(models.Product)
-        .filter(models.CartItem.user_id == current_user.id)
-        .all()
+async def _upsert_lines(db: AsyncSession, user_id: int, quantities: dict[int, int], replace: bool) -> None:
+    """Write many cart lines in one statement, adding to or replacing existing quantities."""
+    now = datetime.utcnow()
+    stmt = upsert_insert(db.bind)(models.CartItem).values(
+        [
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity, "created_at": now}
+            for product_id, quantity in quantities.items()
+        ]
+    )
+    quantity = stmt.excluded.quantity if replace else models.CartItem.quantity + stmt.excluded.quantity
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.CartItem.user_id, models.CartItem.product_id],
+            set_={"quantity": quantity},
+        )
     )
 
+
+async def _load_cart(db: AsyncSession, user_id: int) -> schemas.CartOut:
+    """Build the cart response from one cart/product join."""
+    rows = (
+        await db.execute(
+            select(
+                models.CartItem.id,
+                models.CartItem.quantity,
+                models.Product.id.label("product_id"),
+                models.Product.name,
+                models.Product.category,
+                models.Product.price,
+                models.Product.image_url,
+            )
+            .join(models.Product, models.Product.id == models.CartItem.product_id)
+            .where(models.CartItem.user_id == user_id)
+            .order_by(models.CartItem.id)
+        )
+    ).all()
+
     cart_items_out = []
     total_quantity = 0
     total_amount = 0.0
-    for item in items:
-        product = item.product
-        subtotal = item.quantity * product.price
-        total_quantity += item.quantity
-        total_amount += subtotal
+    for row in rows:
+        total_quantity += row.quantity
+        total_amount += row.quantity * row.price
         cart_items_out.append(
             schemas.CartItemOut(
-                id=item.id,
-                quantity=item.quantity,
-                product=schemas.CartItemProduct.model_validate(product),
+                id=row.id,
+                quantity=row.quantity,
+                product=schemas.CartItemProduct(
+                    id=row.product_id,
+                    name=row.name,
+                    category=row.category,
+                    price=row.price,
+                    image_url=row.image_url,
+                ),
             )
         )
 
@@ -43,93 +76,163 @@ def get_cart(
     )
 
 
+async def _commit_with_cart(db: AsyncSession, user_id: int) -> schemas.CartOut:
+    # Read the cart inside the mutation's transaction, then commit.
+    cart = await _load_cart(db, user_id)
+    await db.commit()
+    return cart
+
+
+@router.get("", response_model=schemas.CartOut)
+async def get_cart(
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user),
+):
+    return await _load_cart(db, current_user.id)
+
+
 @router.post("/items", response_model=schemas.CartOut, status_code=status.HTTP_201_CREATED)
-def add_cart_item(
+async def add_cart_item(
     item_in: schemas.CartItemCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    product = db.query(models.Product).filter(models.Product.id == item_in.product_id).first()
-    if not product:
+    """
+    Add a product to the cart, or increase its quantity if it is already there.
+    One upsert plus the cart read; selecting from products makes a missing
+    product insert nothing instead of relying on the foreign key.
+    """
+    insert = upsert_insert(db.bind)
+    stmt = insert(models.CartItem).from_select(
+        ["user_id", "product_id", "quantity", "created_at"],
+        select(
+            literal(current_user.id),
+            models.Product.id,
+            literal(item_in.quantity),
+            literal(datetime.utcnow()),
+        ).where(models.Product.id == item_in.product_id),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.CartItem.user_id, models.CartItem.product_id],
+        set_={"quantity": models.CartItem.quantity + stmt.excluded.quantity},
+    ).returning(models.CartItem.id)
+
+    if (await db.execute(stmt)).first() is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return await _commit_with_cart(db, current_user.id)
 
-    cart_item = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.user_id == current_user.id,
-            models.CartItem.product_id == item_in.product_id,
-        )
-        .first()
-    )
-    if cart_item:
-        cart_item.quantity += item_in.quantity
-    else:
-        cart_item = models.CartItem(
-            user_id=current_user.id,
-            product_id=item_in.product_id,
-            quantity=item_in.quantity,
+
+@router.post("/batch", response_model=schemas.CartOut)
+async def apply_cart_batch(
+    batch: schemas.CartBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user),
+):
+    """
+    Apply several cart operations in one transaction and return the resulting cart.
+    reorder_order_id adds the lines of a past order first (products deleted since
+    are skipped); operations are then applied in order. The number of statements
+    does not depend on how many operations or order lines there are.
+    """
+    adds: dict[int, int] = {}  # product_id -> quantity added to the current line
+    sets: dict[int, int] = {}  # product_id -> final quantity, 0 removes the line
+
+    if batch.reorder_order_id is not None:
+        rows = (
+            await db.execute(
+                select(models.Order.id, models.Product.id.label("product_id"), models.OrderItem.quantity)
+                .select_from(models.Order)
+                .outerjoin(models.OrderItem, models.OrderItem.order_id == models.Order.id)
+                .outerjoin(models.Product, models.Product.id == models.OrderItem.product_id)
+                .where(models.Order.id == batch.reorder_order_id, models.Order.user_id == current_user.id)
+            )
+        ).all()
+        if not rows:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        for row in rows:
+            if row.product_id is not None:
+                adds[row.product_id] = adds.get(row.product_id, 0) + row.quantity
+
+    for operation in batch.operations:
+        product_id = operation.product_id
+        if operation.op == "add":
+            if product_id in sets:
+                sets[product_id] += operation.quantity
+            else:
+                adds[product_id] = adds.get(product_id, 0) + operation.quantity
+        else:
+            adds.pop(product_id, None)
+            sets[product_id] = operation.quantity if operation.op == "set" else 0
+
+    wanted = set(adds) | {product_id for product_id, quantity in sets.items() if quantity > 0}
+    if wanted:
+        found = set(
+            (await db.scalars(select(models.Product.id).where(models.Product.id.in_(wanted)))).all()
         )
-        db.add(cart_item)
+        missing = sorted(wanted - found)
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Products not found: {', '.join(map(str, missing))}",
+            )
 
-    db.commit()
-    return get_cart(db=db, current_user=current_user)
+    if adds:
+        await _upsert_lines(db, current_user.id, adds, replace=False)
+    replaced = {product_id: quantity for product_id, quantity in sets.items() if quantity > 0}
+    if replaced:
+        await _upsert_lines(db, current_user.id, replaced, replace=True)
+    removed = [product_id for product_id, quantity in sets.items() if quantity == 0]
+    if removed:
+        await db.execute(
+            delete(models.CartItem).where(
+                models.CartItem.user_id == current_user.id,
+                models.CartItem.product_id.in_(removed),
+            )
+        )
+    return await _commit_with_cart(db, current_user.id)
 
 
 @router.patch("/items/{item_id}", response_model=schemas.CartOut)
-def update_cart_item(
+async def update_cart_item(
     item_id: int,
     item_update: schemas.CartItemUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    cart_item = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.id == item_id,
-            models.CartItem.user_id == current_user.id,
-        )
-        .first()
-    )
-    if not cart_item:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
-
+    own_item = (models.CartItem.id == item_id, models.CartItem.user_id == current_user.id)
     if item_update.quantity == 0:
-        db.delete(cart_item)
+        stmt = delete(models.CartItem).where(*own_item)
     else:
-        cart_item.quantity = item_update.quantity
+        stmt = update(models.CartItem).where(*own_item).values(quantity=item_update.quantity)
+    stmt = stmt.returning(models.CartItem.id).execution_options(synchronize_session=False)
 
-    db.commit()
-    return get_cart(db=db, current_user=current_user)
+    if (await db.execute(stmt)).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
+    return await _commit_with_cart(db, current_user.id)
 
 
 @router.delete("/items/{item_id}", response_model=schemas.CartOut)
-def delete_cart_item(
+async def delete_cart_item(
     item_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    cart_item = (
-        db.query(models.CartItem)
-        .filter(
-            models.CartItem.id == item_id,
-            models.CartItem.user_id == current_user.id,
-        )
-        .first()
+    stmt = (
+        delete(models.CartItem)
+        .where(models.CartItem.id == item_id, models.CartItem.user_id == current_user.id)
+        .returning(models.CartItem.id)
+        .execution_options(synchronize_session=False)
     )
-    if not cart_item:
+    if (await db.execute(stmt)).first() is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found")
-
-    db.delete(cart_item)
-    db.commit()
-    return get_cart(db=db, current_user=current_user)
+    return await _commit_with_cart(db, current_user.id)
 
 
 @router.delete("", response_model=schemas.CartOut)
-def clear_cart(
-    db: Session = Depends(get_db),
+async def clear_cart(
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    db.query(models.CartItem).filter(models.CartItem.user_id == current_user.id).delete()
-    db.commit()
-    return get_cart(db=db, current_user=current_user)
-
+    await db.execute(delete(models.CartItem).where(models.CartItem.user_id == current_user.id))
+    await db.commit()
+    return schemas.CartOut(items=[], total_quantity=0, total_amount=0.0)
@@ -1,127 +1,139 @@
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
-from .. import auth, models, schemas
+from .. import auth, checkout, facets, models, schemas
+from ..cache import product_cache
 from ..database import get_db
+from ..instrumentation import TimedRoute
+from ..pagination import NEXT_CURSOR_HEADER, decode_typed_cursor, encode_cursor
 
 
-router = APIRouter(prefix="/orders", tags=["orders"])
+router = APIRouter(prefix="/orders", tags=["orders"], route_class=TimedRoute)
+
+
+async def _load_order(db: AsyncSession, *criteria) -> models.Order | None:
+    """Load one order with its items and their products eagerly (two statements, no lazy loads)."""
+    result = await db.execute(
+        select(models.Order)
+        .options(selectinload(models.Order.items).joinedload(models.OrderItem.product))
+        .where(*criteria)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
 
 
 @router.post("", response_model=schemas.OrderOut, status_code=status.HTTP_201_CREATED)
-def place_order(
+async def place_order(
     order_in: schemas.OrderCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     payment_info = order_in.payment
     if not payment_info.card_last4.isdigit():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid card information")
 
-    cart_items = (
-        db.query(models.CartItem)
-        .join(models.Product)
-        .filter(models.CartItem.user_id == current_user.id)
-        .all()
-    )
-    if not cart_items:
+    try:
+        result = await checkout.checkout_cart(db, current_user.id, order_in)
+    except checkout.CartEmpty:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
-
-    total_amount = 0.0
-    for item in cart_items:
-        total_amount += item.quantity * item.product.price
-
-    now = datetime.utcnow()
-    order = models.Order(
-        user_id=current_user.id,
-        status=models.OrderStatus.CONFIRMED,
-        payment_status=models.PaymentStatus.PAID,
-        total_amount=total_amount,
-        shipping_customer_name=order_in.shipping_customer_name,
-        shipping_address=order_in.shipping_address,
-        shipping_phone=order_in.shipping_phone,
-        shipping_email=order_in.shipping_email,
-        created_at=now,
-        updated_at=now,
-    )
-    db.add(order)
-    db.flush()
-
-    for item in cart_items:
-        product = item.product
-        order_item = models.OrderItem(
-            order_id=order.id,
-            product_id=product.id,
-            quantity=item.quantity,
-            unit_price=product.price,
-            subtotal=item.quantity * product.price,
+    except checkout.InsufficientStock as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Not enough stock for product(s) {', '.join(map(str, e.product_ids))}. Please update your cart",
         )
-        db.add(order_item)
-
-        # Optionally decrease stock if tracking inventory
-        if product.stock is not None and product.stock >= item.quantity:
-            product.stock -= item.quantity
-
-    # Clear cart after order is created
-    db.query(models.CartItem).filter(models.CartItem.user_id == current_user.id).delete()
-    db.commit()
-    db.refresh(order)
+    # Stock changed, so cached product reads are stale
+    await product_cache.invalidate_products(result.product_ids, result.categories)
+    if result.sold_out_categories:
+        await db.run_sync(facets.refresh_facets, result.sold_out_categories)
 
     # Reload with items and product relationships
-    order = (
-        db.query(models.Order)
-        .filter(models.Order.id == order.id)
-        .first()
-    )
+    order = await _load_order(db, models.Order.id == result.order_id)
     return schemas.OrderOut.model_validate(order)
 
 
 @router.get("", response_model=list[schemas.OrderSummary])
-def list_orders(
-    db: Session = Depends(get_db),
+async def list_orders(
+    response: Response,
+    status_filter: list[models.OrderStatus] | None = Query(
+        None, alias="status", description="Only orders in these statuses (repeat for several)"
+    ),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of orders to return"),
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    orders = (
-        db.query(models.Order)
-        .filter(models.Order.user_id == current_user.id)
-        .order_by(models.Order.created_at.desc())
-        .all()
-    )
+    """
+    List the current user's orders, newest first, one page at a time.
+    Keyset pagination on (user_id, created_at, id); with `status`, on the
+    (user_id, status, created_at, id) index. When more orders exist, the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    stmt = select(models.Order).where(models.Order.user_id == current_user.id)
+    if status_filter:
+        stmt = stmt.where(models.Order.status.in_(status_filter))
+    if cursor is not None:
+        created_at, order_id = decode_typed_cursor(cursor, datetime, int)
+        stmt = stmt.where(tuple_(models.Order.created_at, models.Order.id) < tuple_(created_at, order_id))
+    stmt = stmt.order_by(models.Order.created_at.desc(), models.Order.id.desc())
+
+    orders = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
     return [schemas.OrderSummary.model_validate(o) for o in orders]
 
 
+@router.get("/summary", response_model=schemas.OrderCounts)
+async def order_counts(
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user),
+):
+    """
+    Count the current user's orders by status with one GROUP BY over the
+    (user_id, status, ...) index; no orders are loaded.
+    """
+    rows = await db.execute(
+        select(models.Order.status, func.count())
+        .where(models.Order.user_id == current_user.id)
+        .group_by(models.Order.status)
+    )
+    counts = {order_status: 0 for order_status in models.OrderStatus}
+    for order_status, count in rows:
+        counts[order_status] = count
+    return schemas.OrderCounts(counts=counts, total=sum(counts.values()))
+
+
 @router.get("/{order_id}", response_model=schemas.OrderOut)
-def get_order(
+async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
-    order = (
-        db.query(models.Order)
-        .filter(models.Order.id == order_id, models.Order.user_id == current_user.id)
-        .first()
-    )
+    order = await _load_order(db, models.Order.id == order_id, models.Order.user_id == current_user.id)
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     return schemas.OrderOut.model_validate(order)
 
 
 @router.patch("/{order_id}/status", response_model=schemas.OrderOut)
-def update_order_status(
+async def update_order_status(
     order_id: int,
     status_value: models.OrderStatus,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_admin: models.User = Depends(auth.get_current_admin_user),
 ):
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = await db.get(models.Order, order_id)
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
 
     order.status = status_value
     order.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    order = await _load_order(db, models.Order.id == order_id)
     return schemas.OrderOut.model_validate(order)
 
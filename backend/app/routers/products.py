@@ -1,66 +1,369 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Literal
 
-from .. import models, schemas
-from ..database import get_db
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import http_cache, models, schemas, search
+from ..cache import product_cache
+from ..database import SessionLocal, get_db
+from ..images import image_variants
+from ..instrumentation import TimedRoute
+from ..pagination import NEXT_CURSOR_HEADER, decode_typed_cursor, encode_cursor
+from ..suggest import name_suggester
 
-router = APIRouter(prefix="/products", tags=["products"])
+
+router = APIRouter(prefix="/products", tags=["products"], route_class=TimedRoute)
+
+
+CATEGORIES = [{"value": c.value, "label": c.value} for c in models.ProductCategory]
+CATEGORIES_ETAG = http_cache.make_etag("categories", *(c["value"] for c in CATEGORIES))
 
 
 @router.get("/categories", response_model=list[dict])
-def list_categories():
+async def list_categories(request: Request, response: Response):
     """
     Return the fixed list of product categories.
     Use for filters, dropdowns, etc.
     """
-    return [{"value": c.value, "label": c.value} for c in models.ProductCategory]
+    not_modified = http_cache.conditional(request, response, "categories", CATEGORIES_ETAG)
+    if not_modified is not None:
+        return not_modified
+    return CATEGORIES
+
+
+STREAM_BATCH_SIZE = 500
+
+_PRODUCT_LIST = TypeAdapter(list[schemas.ProductOut])
+_CATEGORY_FACETS = TypeAdapter(list[schemas.CategoryFacet])
+
+
+def _products_json(products) -> bytes:
+    """Validate ORM products once and serialize them straight to JSON bytes."""
+    return _PRODUCT_LIST.dump_json(_PRODUCT_LIST.validate_python(products, from_attributes=True))
+
+
+def _json_response(body: bytes | str, response: Response) -> Response:
+    # Returning a Response skips response_model validation and re-encoding; it
+    # does not pick up headers set on the injected response, so copy them over.
+    return Response(content=body, media_type="application/json", headers=response.headers)
+
+
+def _stream_products(stmt):
+    """Yield products as NDJSON lines, fetching from a server-side cursor in batches."""
+    # The request-scoped session is closed before a streaming body is sent,
+    # so the generator owns its own (sync) session for the lifetime of the stream.
+    # Starlette iterates sync generators in the threadpool.
+    db = SessionLocal()
+    try:
+        rows = db.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE)).scalars()
+        for product in rows:
+            yield schemas.ProductOut.model_validate(product).model_dump_json() + "\n"
+    finally:
+        db.close()
+
+
+@router.get("/facets", response_model=list[schemas.CategoryFacet])
+async def list_category_facets(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """
+    Product count, in-stock count and price range for every category, in
+    category order; categories without products have zero counts. Read from
+    the precomputed category_facets table (see facets.py).
+    """
+    stored = {row.category: row for row in await db.scalars(select(models.CategoryFacet))}
+    facets = [
+        schemas.CategoryFacet.model_validate(stored[c.value])
+        if c.value in stored
+        else schemas.CategoryFacet(category=c)
+        for c in models.ProductCategory
+    ]
+    body = _CATEGORY_FACETS.dump_json(facets)
+    not_modified = http_cache.conditional(request, response, "facets", http_cache.make_etag(body))
+    if not_modified is not None:
+        return not_modified
+    return _json_response(body, response)
+
+
+# sort name -> (sort key, descending). Every sort breaks ties on id, which makes the
+# (key, id) pair of the last product on a page a keyset cursor.
+SORTS = {
+    "newest": (models.Product.created_at, True),
+    "price_asc": (models.Product.price, False),
+    "price_desc": (models.Product.price, True),
+    "rating": (models.PRODUCT_AVERAGE_RATING, True),
+}
+
+
+def _sort_value(product: models.Product, sort: str):
+    if sort == "newest":
+        return product.created_at
+    if sort == "rating":
+        return product.rating_sum / product.rating_count if product.rating_count else 0
+    return product.price
+
+
+def listing_statement(
+    categories: list[str] | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool = False,
+    sort: str = "newest",
+    after: list | None = None,
+):
+    """
+    Products matching the listing filters in sort order, starting after the
+    (sort key, id) pair `after`. Each filter/sort combination is served by
+    one of the Product indexes; benchmarks/query_plans.py checks the plans.
+    """
+    key, descending = SORTS[sort]
+    stmt = select(models.Product)
+    if categories:
+        stmt = stmt.where(models.Product.category.in_(categories))
+    if min_price is not None:
+        stmt = stmt.where(models.Product.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(models.Product.price <= max_price)
+    if in_stock:
+        stmt = stmt.where(models.PRODUCT_IN_STOCK)
+    if after is not None:
+        position = tuple_(key, models.Product.id)
+        stmt = stmt.where(position < tuple_(*after) if descending else position > tuple_(*after))
+    if descending:
+        return stmt.order_by(key.desc(), models.Product.id.desc())
+    return stmt.order_by(key, models.Product.id)
+
+
+def _decode_listing_cursor(cursor: str, sort: str) -> list:
+    # A cursor only fits the sort it came from.
+    return decode_typed_cursor(cursor, datetime if sort == "newest" else (int, float), int)
 
 
 @router.get("", response_model=list[schemas.ProductOut])
-def list_products(
-    category: models.ProductCategory | None = Query(None, description="Filter by category"),
-    db: Session = Depends(get_db),
+async def list_products(
+    request: Request,
+    response: Response,
+    category: list[models.ProductCategory] = Query(
+        [], description="Filter by category; repeat the parameter to match any of several"
+    ),
+    min_price: float | None = Query(None, ge=0, description="Only products priced at least this"),
+    max_price: float | None = Query(None, ge=0, description="Only products priced at most this"),
+    in_stock: bool = Query(False, description="Only products with stock left"),
+    sort: Literal["newest", "price_asc", "price_desc", "rating"] = Query("newest", description="Sort order"),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of products to return"),
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    stream: bool = Query(False, description="Stream every remaining product as NDJSON instead of one page"),
+    db: AsyncSession = Depends(get_db),
 ):
-    query = db.query(models.Product)
-    if category is not None:
-        query = query.filter(models.Product.category == category.value)
-    products = query.order_by(models.Product.created_at.desc()).all()
-    return products
+    """
+    List products, filtered by categories, price range and stock, and sorted
+    newest first (default), by price or by average rating, using keyset
+    pagination on (sort key, id). When more products exist, the cursor for the
+    next page is returned in the X-Next-Cursor response header. With
+    `stream=true` all products after `cursor` are streamed as newline-delimited
+    JSON and `limit` is ignored. Non-streamed pages are served from the product
+    cache when possible and carry an ETag over the page body (If-None-Match -> 304).
+    """
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="min_price must not be greater than max_price"
+        )
+    categories = sorted({c.value for c in category})
+    after = _decode_listing_cursor(cursor, sort) if cursor is not None else None
+    stmt = listing_statement(categories, min_price, max_price, in_stock, sort, after)
+
+    if stream:
+        return StreamingResponse(_stream_products(stmt), media_type="application/x-ndjson")
+
+    # A single-category page is invalidated by that category's generation; any other page by the catalog-wide one.
+    cache_key = await product_cache.listing_key(
+        categories[0] if len(categories) == 1 else None,
+        "|".join(categories),
+        min_price,
+        max_price,
+        in_stock,
+        sort,
+        limit,
+        cursor,
+        image_variants.current_version(),
+    )
+    page = await product_cache.get(cache_key)
+    if page is None:
+        products = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            next_cursor = encode_cursor(_sort_value(last, sort), last.id)
+        # Cached pre-serialized, so a cache hit sends the body without touching pydantic.
+        body = _products_json(products)
+        page = {"body": body.decode(), "next_cursor": next_cursor, "etag": http_cache.make_etag(body, next_cursor)}
+        await product_cache.set(cache_key, page)
+
+    not_modified = http_cache.conditional(request, response, "products", page["etag"])
+    if not_modified is not None:
+        return not_modified
+    if page["next_cursor"] is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return _json_response(page["body"], response)
 
 
 @router.get("/search", response_model=list[schemas.ProductOut])
-def search_products(
+async def search_products(
+    response: Response,
     q: str = Query(..., min_length=1, description="Search keywords"),
-    db: Session = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of products to return"),
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    Search products by keywords in name, description, and category.
-    Case-insensitive partial matching.
-    """
-    search_term = f"%{q}%"
-    products = (
-        db.query(models.Product)
-        .filter(
-            or_(
-                models.Product.name.ilike(search_term),
-                models.Product.description.ilike(search_term),
-                models.Product.category.ilike(search_term),
-            )
+    Full-text search over product name, category, and description, ranked by
+    relevance. The last keyword matches as a prefix. When more results exist,
+    the cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    offset = decode_typed_cursor(cursor, int)[0] if cursor is not None else 0
+    if offset < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    products = await search.search_products(db, q, limit=limit + 1, offset=offset)
+    if len(products) > limit:
+        products = products[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+    return _json_response(_products_json(products), response)
+
+
+@router.get("/suggest", response_model=list[schemas.ProductSuggestion])
+async def suggest_products(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix typed so far"),
+    category: models.ProductCategory | None = Query(None, description="Only suggest products in this category"),
+    limit: int = Query(8, ge=1, le=20, description="Maximum number of suggestions"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Autocomplete product names from an in-memory prefix index.
+    Matches any word start in the name; results are deduplicated by name.
+    """
+    if not name_suggester.built:
+        await db.run_sync(name_suggester.build)
+    return [
+        schemas.ProductSuggestion(id=product_id, name=name, category=product_category)
+        for product_id, name, product_category in name_suggester.suggest(
+            q, limit, category.value if category is not None else None
+        )
+    ]
+
+
+# Upper bound on ids per batch lookup (GET or POST).
+MAX_BATCH_IDS = 200
+# products.id is a 32-bit INTEGER on PostgreSQL.
+MAX_PRODUCT_ID = 2**31 - 1
+
+
+def _parse_batch_ids(values: list[str]) -> list[int]:
+    ids = []
+    for value in values:
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                ids.append(int(part))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid product id: {part!r}")
+    return ids
+
+
+async def _load_batch(db: AsyncSession, ids: list[int]) -> tuple[list[dict], list[int]]:
+    """
+    Cached products for ids (first occurrence of each, in order), with the
+    misses read in one IN query and cached. Returns (products, missing ids).
+    Both batch endpoints validate their ids here: 1 to MAX_BATCH_IDS distinct
+    ids, each a positive products.id value, or 400.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No product ids given")
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {MAX_BATCH_IDS} ids per request"
         )
-        .order_by(models.Product.created_at.desc())
-        .all()
+    invalid = [product_id for product_id in ids if not 1 <= product_id <= MAX_PRODUCT_ID]
+    if invalid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid product id: {invalid[0]}")
+    found = await product_cache.get_products(ids)
+    misses = [product_id for product_id in ids if product_id not in found]
+    if misses:
+        rows = await db.scalars(select(models.Product).where(models.Product.id.in_(misses)))
+        loaded = {p.id: schemas.ProductOut.model_validate(p).model_dump(mode="json") for p in rows}
+        await product_cache.set_products(loaded)
+        found.update(loaded)
+    return [found[i] for i in ids if i in found], [i for i in ids if i not in found]
+
+
+@router.get("/batch", response_model=schemas.ProductBatch)
+async def get_products_batch(
+    request: Request,
+    response: Response,
+    ids: list[str] = Query(..., description="Product ids: repeat the parameter or separate them with commas"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get many products at once, in the requested order (duplicates are returned
+    once). Ids that match no product are listed in `missing` instead of
+    failing the request. At most MAX_BATCH_IDS ids; use POST /products/batch
+    for lists too long for a URL. The ETag follows every returned product's
+    updated_at.
+    """
+    products, missing = await _load_batch(db, _parse_batch_ids(ids))
+    etag = http_cache.make_etag(
+        "batch", *(f"{p['id']}@{p['updated_at']}" for p in products), missing, image_variants.current_version()
     )
-    return products
+    not_modified = http_cache.conditional(request, response, "products", etag)
+    if not_modified is not None:
+        return not_modified
+    return _json_response(orjson.dumps({"products": products, "missing": missing}), response)
+
+
+@router.post("/batch", response_model=schemas.ProductBatch)
+async def post_products_batch(
+    batch: schemas.ProductBatchRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """Same as GET /products/batch, with the ids in the request body."""
+    products, missing = await _load_batch(db, batch.ids)
+    return _json_response(orjson.dumps({"products": products, "missing": missing}), response)
 
 
 @router.get("/{product_id}", response_model=schemas.ProductOut)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        from fastapi import HTTPException, status
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get one product. ETag and Last-Modified follow the product's updated_at
+    (and the image variant manifest).
+    """
+    cached = await product_cache.get_product(product_id)
+    if cached is not None:
+        updated_at = datetime.fromisoformat(cached["updated_at"])
+    else:
+        product = await db.get(models.Product, product_id)
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        updated_at = product.updated_at
 
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    etag = http_cache.make_etag("product", product_id, updated_at.isoformat(), image_variants.current_version())
+    not_modified = http_cache.conditional(request, response, "product", etag, updated_at)
+    if not_modified is not None:
+        return not_modified
+    if cached is not None:
+        return cached
+    await product_cache.set_product(product_id, schemas.ProductOut.model_validate(product).model_dump(mode="json"))
     return product
 
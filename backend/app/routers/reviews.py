@@ -1,13 +1,19 @@
 from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from .. import auth, models, schemas
+from .. import auth, http_cache, models, ratings, schemas
+from ..cache import product_cache
 from ..database import get_db
+from ..instrumentation import TimedRoute
+from ..pagination import NEXT_CURSOR_HEADER, decode_typed_cursor, encode_cursor
 
 
-router = APIRouter(tags=["reviews"])
+router = APIRouter(tags=["reviews"], route_class=TimedRoute)
 
 
 def _review_to_out(review: models.Review) -> schemas.ReviewOut:
@@ -27,43 +33,138 @@ def _review_to_out(review: models.Review) -> schemas.ReviewOut:
     )
 
 
-@router.get("/products/{product_id}/reviews", response_model=list[schemas.ReviewOut])
-def list_product_reviews(product_id: int, db: Session = Depends(get_db)):
-    """List all reviews for a product. Public."""
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+async def _load_review(db: AsyncSession, review_id: int) -> models.Review | None:
+    """Load a review together with its author."""
+    return await db.scalar(
+        select(models.Review)
+        .options(joinedload(models.Review.user))
+        .where(models.Review.id == review_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def _commit_with_rating(
+    db: AsyncSession, product_id: int, old_rating: int | None, new_rating: int | None
+) -> None:
+    """
+    Commit the pending review change together with the product's rating aggregates.
+    The product row is updated even when the rating is unchanged, so its
+    updated_at (and with it the reviews ETag) moves with every review change.
+    """
+    category = await ratings.apply_rating_change(db, product_id, old_rating, new_rating)
+    await db.commit()
+    await product_cache.invalidate_products([product_id], [category])
+
+
+# Keyset sort keys and direction for each sort option; each matches a reviews index.
+REVIEW_SORTS = {
+    "newest": ((models.Review.created_at, models.Review.id), "desc"),
+    "highest": ((models.Review.rating, models.Review.created_at, models.Review.id), "desc"),
+    "lowest": ((models.Review.rating, models.Review.created_at, models.Review.id), "asc"),
+}
+
+
+async def _get_product_or_404(db: AsyncSession, product_id: int) -> models.Product:
+    product = await db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return product
 
-    reviews = (
-        db.query(models.Review)
+
+@router.get("/products/{product_id}/reviews", response_model=list[schemas.ReviewOut])
+async def list_product_reviews(
+    product_id: int,
+    request: Request,
+    response: Response,
+    sort: Literal["newest", "highest", "lowest"] = Query("newest", description="newest, highest or lowest rating first"),
+    rating: int | None = Query(None, ge=1, le=5, description="Only reviews with this many stars"),
+    user_id: int | None = Query(None, description="Only reviews by this user"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of reviews to return"),
+    cursor: str | None = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    List reviews for a product, one page at a time. Public.
+    Keyset pagination on (product_id, created_at, id), or on rating first for
+    the highest/lowest sorts (which skip legacy reviews without a rating).
+    Ties in rating are newest first for highest and oldest first for lowest, so
+    each sort is a single index range scan. The next page's cursor is returned
+    in the X-Next-Cursor header. ETag and Last-Modified follow the product's
+    updated_at, which every review change bumps.
+    """
+    product = await _get_product_or_404(db, product_id)
+    etag = http_cache.make_etag(
+        "reviews", product_id, product.updated_at.isoformat(), sort, rating, user_id, limit, cursor
+    )
+    not_modified = http_cache.conditional(request, response, "reviews", etag, product.updated_at)
+    if not_modified is not None:
+        return not_modified
+
+    keys, direction = REVIEW_SORTS[sort]
+    stmt = (
+        select(models.Review)
         .options(joinedload(models.Review.user))
-        .filter(models.Review.product_id == product_id)
-        .order_by(models.Review.created_at.desc())
-        .all()
+        .where(models.Review.product_id == product_id)
     )
+    if sort != "newest":
+        stmt = stmt.where(models.Review.rating.is_not(None))
+    if rating is not None:
+        stmt = stmt.where(models.Review.rating == rating)
+    if user_id is not None:
+        stmt = stmt.where(models.Review.user_id == user_id)
+    if cursor is not None:
+        after = tuple_(*decode_typed_cursor(cursor, *(key.type.python_type for key in keys)))
+        stmt = stmt.where(tuple_(*keys) < after if direction == "desc" else tuple_(*keys) > after)
+    stmt = stmt.order_by(*(key.desc() if direction == "desc" else key.asc() for key in keys))
+
+    reviews = (await db.execute(stmt.limit(limit + 1))).scalars().all()
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        last = reviews[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*(getattr(last, key.key) for key in keys))
     return [_review_to_out(r) for r in reviews]
 
 
+@router.get("/products/{product_id}/reviews/histogram", response_model=schemas.RatingHistogram)
+async def product_rating_histogram(product_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Star histogram for a product: how many reviews gave 1-5 stars. Public.
+    Counted with one GROUP BY on the reviews index; no review rows are loaded.
+    """
+    await _get_product_or_404(db, product_id)
+    rows = await db.execute(
+        select(models.Review.rating, func.count())
+        .where(models.Review.product_id == product_id, models.Review.rating.is_not(None))
+        .group_by(models.Review.rating)
+    )
+    counts = {stars: 0 for stars in range(1, 6)}
+    for stars, count in rows:
+        counts[stars] = count
+    total = sum(counts.values())
+    average = round(sum(stars * count for stars, count in counts.items()) / total, 2) if total else None
+    return schemas.RatingHistogram(counts=counts, total=total, average_rating=average)
+
+
 @router.post(
     "/products/{product_id}/reviews",
     response_model=schemas.ReviewOut,
     status_code=status.HTTP_201_CREATED,
 )
-def create_review(
+async def create_review(
     product_id: int,
     review_in: schemas.ReviewCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     """Add a review (comment) for a product. Requires authentication. One review per user per product."""
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    await _get_product_or_404(db, product_id)
 
-    existing = db.query(models.Review).filter(
-        models.Review.product_id == product_id,
-        models.Review.user_id == current_user.id,
-    ).first()
+    existing = await db.scalar(
+        select(models.Review).where(
+            models.Review.product_id == product_id,
+            models.Review.user_id == current_user.id,
+        )
+    )
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have already reviewed this product")
 
@@ -74,65 +175,59 @@ def create_review(
         rating=review_in.rating,
     )
     db.add(review)
-    db.commit()
-    db.refresh(review)
+    await _commit_with_rating(db, product_id, None, review.rating)
     # Reload with user for author
-    review = db.query(models.Review).options(joinedload(models.Review.user)).filter(models.Review.id == review.id).first()
+    review = await _load_review(db, review.id)
     return _review_to_out(review)
 
 
 @router.get("/reviews/{review_id}", response_model=schemas.ReviewOut)
-def get_review(review_id: int, db: Session = Depends(get_db)):
+async def get_review(review_id: int, db: AsyncSession = Depends(get_db)):
     """Get a single review by ID. Public."""
-    review = (
-        db.query(models.Review)
-        .options(joinedload(models.Review.user))
-        .filter(models.Review.id == review_id)
-        .first()
-    )
+    review = await _load_review(db, review_id)
     if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
     return _review_to_out(review)
 
 
 @router.put("/reviews/{review_id}", response_model=schemas.ReviewOut)
-def update_review(
+async def update_review(
     review_id: int,
     review_in: schemas.ReviewUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     """Update your own review. Requires authentication."""
-    review = db.query(models.Review).filter(models.Review.id == review_id).first()
+    review = await db.get(models.Review, review_id)
     if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
     if review.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only edit your own review")
 
+    old_rating = review.rating
     if review_in.comment is not None:
         review.comment = review_in.comment
     if review_in.rating is not None:
         review.rating = review_in.rating
     review.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(review)
-    review = db.query(models.Review).options(joinedload(models.Review.user)).filter(models.Review.id == review.id).first()
+    await _commit_with_rating(db, review.product_id, old_rating, review.rating)
+    review = await _load_review(db, review.id)
     return _review_to_out(review)
 
 
 @router.delete("/reviews/{review_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_review(
+async def delete_review(
     review_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(auth.get_current_active_user),
 ):
     """Delete your own review or any review if admin. Requires authentication."""
-    review = db.query(models.Review).filter(models.Review.id == review_id).first()
+    review = await db.get(models.Review, review_id)
     if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found")
     if review.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only delete your own review")
 
-    db.delete(review)
-    db.commit()
+    await db.delete(review)
+    await _commit_with_rating(db, review.product_id, review.rating, None)
     return None
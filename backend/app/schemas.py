@@ -1,9 +1,10 @@
 import re
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, EmailStr, Field, computed_field, field_validator
 
+from .images import image_variants
 from .models import OrderStatus, PaymentStatus, ProductCategory
 
 
@@ -125,11 +126,69 @@ class ProductCreate(ProductBase):
 class ProductOut(ProductBase):
     id: int
     created_at: datetime
+    updated_at: datetime
+    rating_sum: int = 0
+    rating_count: int = 0
+
+    @computed_field
+    @property
+    def average_rating(self) -> Optional[float]:
+        """Mean star rating, or None when the product has no rated reviews."""
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[dict[str, dict[str, str]]]:
+        """Resized image URLs by size (thumb, card, detail) and format (webp, jpeg), once built."""
+        return image_variants.urls(self.image_url)
+
+    class Config:
+        from_attributes = True
+
+
+class CategoryFacet(BaseModel):
+    category: ProductCategory
+    product_count: int = 0
+    in_stock_count: int = 0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
 
     class Config:
         from_attributes = True
 
 
+class ProductBatchRequest(BaseModel):
+    ids: List[int] = Field(description="Product ids, in the order to return them (1 to 200)")
+
+
+class ProductBatch(BaseModel):
+    """Products in the requested order; ids that matched no product are listed in missing."""
+    products: List[ProductOut]
+    missing: List[int]
+
+
+class ProductSuggestion(BaseModel):
+    id: int
+    name: str
+    category: Optional[str] = None
+
+
+class ProductImportError(BaseModel):
+    line: int
+    error: str
+
+
+class ProductImportSummary(BaseModel):
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    chunks: int = 0
+    errors: List[ProductImportError] = []
+    # True when more rows failed than are listed in errors
+    errors_truncated: bool = False
+
+
 # --------- Reviews ----------
 
 
@@ -153,6 +212,13 @@ class ReviewOut(BaseModel):
     created_at: datetime
 
 
+class RatingHistogram(BaseModel):
+    """Number of reviews per star rating (keys 1-5); reviews without a rating are not counted."""
+    counts: dict[int, int]
+    total: int
+    average_rating: Optional[float] = None
+
+
 # --------- Cart ----------
 
 
@@ -165,6 +231,26 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(ge=0)
 
 
+class CartOperation(BaseModel):
+    """add: increase by quantity; set: replace the quantity (0 removes); remove: drop the line."""
+    op: Literal["add", "set", "remove"]
+    product_id: int
+    quantity: int = Field(default=1, ge=0)
+
+    @field_validator('quantity')
+    @classmethod
+    def quantity_positive_for_add(cls, v: int, info) -> int:
+        if info.data.get("op") == "add" and v == 0:
+            raise ValueError("Quantity must be greater than 0 for add")
+        return v
+
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation] = Field(default_factory=list, max_length=200)
+    # Add every line of one of the user's past orders before applying the operations.
+    reorder_order_id: Optional[int] = None
+
+
 class CartItemProduct(BaseModel):
     id: int
     name: str
@@ -247,6 +333,12 @@ class OrderOut(BaseModel):
         from_attributes = True
 
 
+class OrderCounts(BaseModel):
+    """How many orders the user has in each status."""
+    counts: dict[OrderStatus, int]
+    total: int
+
+
 class OrderSummary(BaseModel):
     id: int
     status: OrderStatus
@@ -261,3 +353,8 @@ class OrderSummary(BaseModel):
     class Config:
         from_attributes = True
 
+
+class AdminOrderSummary(OrderSummary):
+    user_id: int
+    updated_at: datetime
+
@@ -0,0 +1,191 @@
+"""
+Product full-text search.
+
+On PostgreSQL, products carry a generated, weighted `search_vector` tsvector
+column with a GIN index, and results are ranked with ts_rank_cd. On other
+databases (SQLite for local development) an in-process inverted index with
+BM25 scoring is used instead; the admin router keeps it in sync on writes.
+"""
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+# Field boosts: a match in the name counts more than one in the description.
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+
+
+
+def tokenize(value: str | None) -> list[str]:
+    if not value:
+        return []
+    return _TOKEN_RE.findall(value.lower())
+
+
+def uses_postgres(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+
+
+class ProductSearchIndex:
+    """In-memory inverted index (token -> {product_id: weighted term frequency}) with BM25 ranking."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._doc_tokens: dict[int, dict[str, int]] = {}
+        self._doc_lengths: dict[int, int] = {}
+        self._total_length = 0
+        self._vocabulary: list[str] | None = None
+        self.built = False
+
+    def build(self, db: Session) -> None:
+        """(Re)build the index from every product in the database."""
+        # Searches wait on the lock, so the products are loaded before it is taken.
+        products = db.execute(select(models.Product)).scalars().all()
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+            self._vocabulary = None
+            for product in products:
+                self._add(product)
+            self.built = True
+
+    def upsert(self, product: models.Product) -> None:
+        if not self.built:
+            return
+        with self._lock:
+            self._remove(product.id)
+            self._add(product)
+            self._vocabulary = None
+
+    def remove(self, product_id: int) -> None:
+        if not self.built:
+            return
+        with self._lock:
+            self._remove(product_id)
+            self._vocabulary = None
+
+    def _add(self, product: models.Product) -> None:
+        counts: dict[str, int] = defaultdict(int)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(product, field)):
+                counts[token] += weight
+        if not counts:
+            return
+        for token, tf in counts.items():
+            self._postings[token][product.id] = tf
+        self._doc_tokens[product.id] = dict(counts)
+        length = sum(counts.values())
+        self._doc_lengths[product.id] = length
+        self._total_length += length
+
+    def _remove(self, product_id: int) -> None:
+        tokens = self._doc_tokens.pop(product_id, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(product_id)
+
+    def _expand_prefix(self, prefix: str) -> list[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        terms = []
+        i = bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            terms.append(vocabulary[i])
+            i += 1
+        return terms
+
+    def search(self, query: str) -> list[tuple[int, float]]:
+        """
+        Return (product_id, score) pairs, best first. Every query token must
+        match; the last token is treated as a prefix so partially typed words
+        still find results.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count
+
+            scores: dict[int, float] | None = None
+            for position, token in enumerate(tokens):
+                terms = self._expand_prefix(token) if position == len(tokens) - 1 else [token]
+                token_scores: dict[int, float] = defaultdict(float)
+                for term in terms:
+                    postings = self._postings.get(term, {})
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for product_id, tf in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[product_id] / avg_length)
+                        token_scores[product_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                if scores is None:
+                    scores = dict(token_scores)
+                else:
+                    scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+product_index = ProductSearchIndex()
+
+
+def _to_tsquery_text(query: str) -> str | None:
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    tokens[-1] += ":*"
+    return " & ".join(tokens)
+
+
+async def search_products(db: AsyncSession, query: str, limit: int, offset: int = 0) -> list[models.Product]:
+    """Return products matching `query`, most relevant first."""
+    if uses_postgres(db.bind):
+        tsquery_text = _to_tsquery_text(query)
+        if tsquery_text is None:
+            return []
+        tsquery = func.to_tsquery("english", tsquery_text)
+        vector = literal_column("products.search_vector")
+        stmt = (
+            select(models.Product)
+            .where(vector.op("@@")(tsquery))
+            .order_by(func.ts_rank_cd(vector, tsquery).desc(), models.Product.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        return list((await db.execute(stmt)).scalars())
+
+    if not product_index.built:
+        await db.run_sync(product_index.build)
+    ids = [product_id for product_id, _ in product_index.search(query)[offset:offset + limit]]
+    if not ids:
+        return []
+    rows = await db.execute(select(models.Product).where(models.Product.id.in_(ids)))
+    by_id = {p.id: p for p in rows.scalars()}
+    return [by_id[i] for i in ids if i in by_id]
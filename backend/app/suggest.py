@@ -0,0 +1,115 @@
+"""
+Product name autocomplete.
+
+An in-memory, sorted prefix index over product names. Every word start in a
+name is indexed, so "pro" matches both "Protein Bar" and "iPhone 17 Pro".
+Lookups are a binary search plus a short scan, so they never touch the
+database. The index is built at startup and patched by the admin router.
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+_WORD_START_RE = re.compile(r"(?:^|(?<=[^0-9a-z]))[0-9a-z]")
+
+# Upper bound on index entries inspected per lookup, so very short prefixes stay fast.
+MAX_SCAN = 500
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def _word_keys(name: str) -> list[str]:
+    """Index keys for a name: the normalized name from each word start onwards."""
+    normalized = _normalize(name)
+    return [normalized[m.start():] for m in _WORD_START_RE.finditer(normalized)]
+
+
+class NameSuggester:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Sorted (key, product_id) pairs; key is the normalized name from a word start onwards.
+        self._entries: list[tuple[str, int]] = []
+        self._products: dict[int, tuple[str, str | None, list[str]]] = {}
+        self.built = False
+
+    def build(self, db: Session) -> None:
+        """(Re)build the index from every product in the database."""
+        rows = db.execute(select(models.Product.id, models.Product.name, models.Product.category)).all()
+        # A rebuild starts from empty structures and swaps them in whole, so
+        # it never depends on the previous index and lookups never see half of one.
+        entries: list[tuple[str, int]] = []
+        products: dict[int, tuple[str, str | None, list[str]]] = {}
+        for product_id, name, category in rows:
+            keys = _word_keys(name)
+            products[product_id] = (name, category, keys)
+            entries.extend((key, product_id) for key in keys)
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._products = products
+            self.built = True
+
+    def upsert(self, product: models.Product) -> None:
+        if not self.built:
+            return
+        with self._lock:
+            self._unindex(product.id)
+            keys = _word_keys(product.name)
+            self._products[product.id] = (product.name, product.category, keys)
+            for key in keys:
+                insort(self._entries, (key, product.id))
+
+    def remove(self, product_id: int) -> None:
+        if not self.built:
+            return
+        with self._lock:
+            self._unindex(product_id)
+
+    def _unindex(self, product_id: int) -> None:
+        existing = self._products.pop(product_id, None)
+        if existing is None:
+            return
+        for key in existing[2]:
+            i = bisect_left(self._entries, (key, product_id))
+            if i < len(self._entries) and self._entries[i] == (key, product_id):
+                del self._entries[i]
+
+    def suggest(self, prefix: str, limit: int, category: str | None = None) -> list[tuple[int, str, str | None]]:
+        """
+        Return up to `limit` (product_id, name, category) tuples whose name has a
+        word starting with `prefix`. Names that start with the prefix come
+        first; duplicate names are returned once.
+        """
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        leading: list[tuple[int, str, str | None]] = []
+        inner: list[tuple[int, str, str | None]] = []
+        seen: set[str] = set()
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (prefix,))
+            end = min(len(entries), i + MAX_SCAN)
+            while i < end and entries[i][0].startswith(prefix) and len(leading) < limit:
+                key, product_id = entries[i]
+                i += 1
+                name, product_category, keys = self._products[product_id]
+                if category is not None and product_category != category:
+                    continue
+                folded = name.casefold()
+                if folded in seen:
+                    continue
+                seen.add(folded)
+                (leading if key == keys[0] else inner).append((product_id, name, product_category))
+        return (leading + inner)[:limit]
+
+
+name_suggester = NameSuggester()
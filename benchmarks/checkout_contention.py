@@ -0,0 +1,134 @@
+"""
+Checkout contention benchmark.
+
+Many users check out the same hot SKU at once. Reports throughput and
+checks that the checkout engine never oversells: units sold must not
+exceed the starting stock, and the final stock must match what was sold.
+
+Runs in-process through the ASGI app. It uses a throwaway SQLite database
+unless --database-url is given; each run creates its own SKU and users, so
+it can point at a scratch PostgreSQL database too:
+
+    python -m benchmarks.checkout_contention --users 300 --stock 100 --concurrency 50
+    python -m benchmarks.checkout_contention --database-url postgresql+psycopg2://postgres@localhost/bench_db
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="concurrent buyers, one order each")
+    parser.add_argument("--stock", type=int, default=50, help="starting stock of the hot SKU")
+    parser.add_argument("--quantity", type=int, default=1, help="units of the hot SKU per cart")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    return parser.parse_args(argv)
+
+
+ARGS = _parse_args(sys.argv[1:]) if __name__ == "__main__" else _parse_args([])
+os.environ["DATABASE_URL"] = ARGS.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='shoppy-bench-')}/bench.db"
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from backend.app import auth, models  # noqa: E402
+from backend.app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from backend.app.main import app  # noqa: E402
+
+
+ORDER_BODY = {
+    "shipping_customer_name": "Bench",
+    "payment": {"cardholder_name": "Bench", "card_last4": "4242", "expiry_month": 1, "expiry_year": 2030},
+}
+
+
+def _seed(run_id: str) -> tuple[int, list[str]]:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        product = models.Product(name=f"Hot SKU {run_id}", price=9.99, stock=ARGS.stock)
+        db.add(product)
+        users = [
+            models.User(email=f"bench-{run_id}-{i}@example.com", hashed_password="!")
+            for i in range(ARGS.users)
+        ]
+        db.add_all(users)
+        db.flush()
+        db.add_all(
+            models.CartItem(user_id=user.id, product_id=product.id, quantity=ARGS.quantity) for user in users
+        )
+        db.commit()
+        return product.id, [auth.create_access_token(subject=user.email) for user in users]
+    finally:
+        db.close()
+
+
+async def _run(tokens: list[str]) -> dict:
+    semaphore = asyncio.Semaphore(ARGS.concurrency)
+    statuses: dict[int, int] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def buy(token: str) -> None:
+            async with semaphore:
+                response = await client.post(
+                    "/orders", json=ORDER_BODY, headers={"Authorization": f"Bearer {token}"}
+                )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(buy(token) for token in tokens))
+        elapsed = time.perf_counter() - start
+    if async_engine is not None:
+        # Close pooled connections while their event loop is still running.
+        await async_engine.dispose()
+    return {"elapsed_s": elapsed, "statuses": statuses}
+
+
+def main() -> int:
+    run_id = uuid.uuid4().hex[:8]
+    product_id, tokens = _seed(run_id)
+    outcome = asyncio.run(_run(tokens))
+
+    db = SessionLocal()
+    try:
+        final_stock = db.scalar(select(models.Product.stock).where(models.Product.id == product_id))
+        units_sold = db.scalar(
+            select(func.coalesce(func.sum(models.OrderItem.quantity), 0)).where(
+                models.OrderItem.product_id == product_id
+            )
+        )
+    finally:
+        db.close()
+
+    placed = outcome["statuses"].get(201, 0)
+    report = {
+        "database": engine.dialect.name,
+        "users": ARGS.users,
+        "concurrency": ARGS.concurrency,
+        "initial_stock": ARGS.stock,
+        "quantity_per_order": ARGS.quantity,
+        "orders_placed": placed,
+        "rejected_out_of_stock": outcome["statuses"].get(409, 0),
+        "other_statuses": {str(k): v for k, v in outcome["statuses"].items() if k not in (201, 409)},
+        "elapsed_s": round(outcome["elapsed_s"], 4),
+        "orders_per_sec": round(placed / outcome["elapsed_s"], 2) if outcome["elapsed_s"] else None,
+        "requests_per_sec": round(ARGS.users / outcome["elapsed_s"], 2) if outcome["elapsed_s"] else None,
+        "units_sold": units_sold,
+        "final_stock": final_stock,
+        "oversell": max(0, units_sold - ARGS.stock),
+        "stock_consistent": final_stock == ARGS.stock - units_sold,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report["oversell"] == 0 and report["stock_consistent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Benchmark data generator.
+
+Seeds users, products, reviews and orders through the models. The same
+--seed always produces the same catalog, so runs against a fresh database
+are comparable. Every run tags its users with a run id, so it can also add
+data to a database that already has some.
+
+    python -m benchmarks.datagen --database-url sqlite:////tmp/bench.db --products 5000 --orders 20000
+
+Users get the password in BENCH_PASSWORD; products get descriptions drawn
+from WORDS, which is also where the load test picks its search terms.
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+
+BENCH_PASSWORD = "Bench#Pass1"
+BATCH_SIZE = 1000
+SOLD_OUT_SHARE = 0.1
+
+WORDS = (
+    "wireless", "organic", "leather", "classic", "portable", "smart", "cotton", "steel",
+    "vintage", "compact", "premium", "outdoor", "bamboo", "ceramic", "digital", "waterproof",
+    "lightweight", "ergonomic", "handmade", "rechargeable", "modern", "travel", "kitchen", "studio",
+)
+NOUNS = {
+    "Electronics": ("headphones", "speaker", "charger", "keyboard", "monitor", "camera"),
+    "Fashion & Apparel": ("jacket", "sneakers", "scarf", "backpack", "shirt", "watch"),
+    "Books & Media": ("novel", "cookbook", "atlas", "vinyl", "journal", "guide"),
+    "Home & Living": ("lamp", "rug", "mug", "pillow", "shelf", "planter"),
+    "Sports & Outdoor": ("tent", "bottle", "racket", "helmet", "mat", "bike"),
+    "Grocery & Food": ("coffee", "tea", "honey", "olive oil", "granola", "chocolate"),
+}
+
+
+@dataclass
+class SeedResult:
+    run_id: str
+    user_emails: list[str] = field(default_factory=list)
+    product_ids: list[int] = field(default_factory=list)
+    reviews: int = 0
+    orders: int = 0
+
+
+def _batches(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def seed(db, users: int, products: int, reviews: int, orders: int, seed: int = 0) -> SeedResult:
+    """
+    Insert the given numbers of rows and commit. Product rating aggregates
+    are set to match the generated reviews, as ratings.py would keep them.
+    """
+    from backend.app import auth, models
+
+    rng = random.Random(seed)
+    result = SeedResult(run_id=uuid.uuid4().hex[:8])
+    now = datetime.utcnow()
+    # One bcrypt hash for everyone: hashing is deliberately slow and not what is being seeded.
+    hashed_password = auth.get_password_hash(BENCH_PASSWORD)
+
+    user_ids = []
+    for batch in _batches(range(users)):
+        rows = [
+            models.User(
+                email=f"bench-{result.run_id}-{i}@example.com",
+                full_name=f"Bench User {i}",
+                hashed_password=hashed_password,
+                created_at=now - timedelta(days=rng.randrange(365)),
+            )
+            for i in batch
+        ]
+        db.add_all(rows)
+        db.flush()
+        user_ids += [user.id for user in rows]
+        result.user_emails += [user.email for user in rows]
+
+    categories = list(NOUNS)
+    prices: dict[int, float] = {}
+    for batch in _batches(range(products)):
+        rows = []
+        for i in batch:
+            category = rng.choice(categories)
+            adjectives = rng.sample(WORDS, 2)
+            noun = rng.choice(NOUNS[category])
+            created_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+            rows.append(
+                models.Product(
+                    name=f"{adjectives[0].title()} {adjectives[1]} {noun} {i}",
+                    description=" ".join(rng.sample(WORDS, 6) + [noun]),
+                    category=category,
+                    price=round(rng.uniform(2, 500), 2),
+                    # Some products sold out; the rest with plenty of stock, so load-test checkouts succeed.
+                    stock=0 if rng.random() < SOLD_OUT_SHARE else rng.randrange(1000, 100000),
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+            )
+        db.add_all(rows)
+        db.flush()
+        for product in rows:
+            result.product_ids.append(product.id)
+            prices[product.id] = product.price
+    db.commit()
+
+    if reviews and user_ids and result.product_ids:
+        ratings: dict[int, list[int]] = {}
+        # At most one review per (user, product), as the API allows.
+        pairs: set[tuple[int, int]] = set()
+        attempts = 0
+        while len(pairs) < reviews and attempts < reviews * 3:
+            pairs.add((rng.choice(user_ids), rng.choice(result.product_ids)))
+            attempts += 1
+        for batch in _batches(sorted(pairs)):
+            rows = []
+            for user_id, product_id in batch:
+                rating = rng.choices((1, 2, 3, 4, 5, None), weights=(1, 1, 2, 4, 5, 1))[0]
+                created_at = now - timedelta(minutes=rng.randrange(180 * 24 * 60))
+                rows.append(
+                    models.Review(
+                        user_id=user_id,
+                        product_id=product_id,
+                        comment=" ".join(rng.sample(WORDS, 8)),
+                        rating=rating,
+                        created_at=created_at,
+                        updated_at=created_at,
+                    )
+                )
+                if rating is not None:
+                    ratings.setdefault(product_id, []).append(rating)
+            db.add_all(rows)
+            db.flush()
+        for batch in _batches(list(ratings.items())):
+            db.execute(
+                update(models.Product),
+                [
+                    {"id": product_id, "rating_sum": sum(values), "rating_count": len(values)}
+                    for product_id, values in batch
+                ],
+            )
+        result.reviews = len(pairs)
+        db.commit()
+
+    if orders and user_ids and result.product_ids:
+        statuses = list(models.OrderStatus)
+        for batch in _batches(range(orders)):
+            rows = []
+            for _ in batch:
+                items = []
+                for product_id in rng.sample(result.product_ids, min(rng.randint(1, 5), len(result.product_ids))):
+                    quantity = rng.randint(1, 3)
+                    items.append(
+                        models.OrderItem(
+                            product_id=product_id,
+                            quantity=quantity,
+                            unit_price=prices[product_id],
+                            subtotal=round(prices[product_id] * quantity, 2),
+                        )
+                    )
+                status = rng.choice(statuses)
+                created_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+                rows.append(
+                    models.Order(
+                        user_id=rng.choice(user_ids),
+                        status=status,
+                        payment_status=(
+                            models.PaymentStatus.PENDING if status == models.OrderStatus.PENDING
+                            else models.PaymentStatus.PAID
+                        ),
+                        total_amount=round(sum(item.subtotal for item in items), 2),
+                        shipping_customer_name="Bench User",
+                        shipping_address="1 Benchmark Way",
+                        created_at=created_at,
+                        updated_at=created_at,
+                        items=items,
+                    )
+                )
+            db.add_all(rows)
+            db.flush()
+            db.expunge_all()
+        result.orders = orders
+        db.commit()
+    return result
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed gives the same data")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / the app's configured database")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from backend.app.database import Base, SessionLocal, engine
+    from backend.app.main import on_startup
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = seed(db, args.users, args.products, args.reviews, args.orders, seed=args.seed)
+    finally:
+        db.close()
+    # Migrations, indexes and search structures, as on app startup.
+    on_startup()
+    print(
+        f"Seeded run {result.run_id}: {len(result.user_emails)} users, {len(result.product_ids)} products, "
+        f"{result.reviews} reviews, {result.orders} orders ({engine.dialect.name})"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+"""
+API load test.
+
+Seeds a database with benchmarks.datagen, then has --virtual-users shoppers
+run a scenario --iterations times each, concurrently. The default "shop"
+scenario is the storefront funnel:
+
+    browse   GET /products, GET /products?category=..., the same with price/stock filters and a sort,
+             GET /products/{id}, GET /products/{id}/reviews
+    search   GET /products/search?q=...
+    cart     POST /cart/items (twice), GET /cart
+    checkout POST /orders
+
+"browse", "search" and "checkout" run one stage on its own. Requests go
+in-process through the ASGI app (--mode inprocess, the default), or over
+HTTP to `uvicorn --workers N` started on the seeded database (--mode uvicorn).
+
+The report is JSON: throughput and p50/p95/p99 latency per endpoint and in
+total. Save one as a baseline and pass it with --baseline to exit non-zero
+when an endpoint's p95 or throughput regresses by more than --tolerance:
+
+    python -m benchmarks.load --output baseline.json
+    python -m benchmarks.load --baseline baseline.json --tolerance 0.25
+    python -m benchmarks.load --mode uvicorn --workers 4 --virtual-users 64
+    python -m benchmarks.load --database-url postgresql+psycopg2://postgres@localhost/bench_db
+
+Without --database-url a temporary SQLite file is used. Each run seeds its
+own users, so a scratch PostgreSQL database can be reused between runs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+SCENARIOS = ("shop", "browse", "search", "checkout")
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="shop")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes (--mode uvicorn)")
+    parser.add_argument("--virtual-users", type=int, default=16, help="concurrent shoppers")
+    parser.add_argument("--iterations", type=int, default=10, help="scenario runs per virtual user")
+    parser.add_argument("--warmup", type=int, default=1, help="unrecorded scenario runs per virtual user first")
+    parser.add_argument("--users", type=int, default=200, help="seeded users (at least --virtual-users)")
+    parser.add_argument("--products", type=int, default=2000, help="seeded products")
+    parser.add_argument("--reviews", type=int, default=5000, help="seeded reviews")
+    parser.add_argument("--orders", type=int, default=5000, help="seeded orders")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the data and the shoppers")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs. the baseline (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+ARGS = _parse_args(sys.argv[1:]) if __name__ == "__main__" else _parse_args([])
+os.environ["DATABASE_URL"] = ARGS.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='shoppy-load-')}/load.db"
+
+import httpx  # noqa: E402
+
+from backend.app import auth  # noqa: E402
+from backend.app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from backend.app.main import app, on_startup  # noqa: E402
+
+from .datagen import NOUNS, WORDS, seed  # noqa: E402
+
+
+ORDER_BODY = {
+    "shipping_customer_name": "Bench User",
+    "shipping_address": "1 Benchmark Way",
+    "payment": {"cardholder_name": "Bench User", "card_last4": "4242", "expiry_month": 1, "expiry_year": 2030},
+}
+
+
+class Recorder:
+    """Latency samples and status counts per endpoint name."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+        self.recording = False
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            self.samples.setdefault(name, []).append(elapsed)
+            statuses = self.statuses.setdefault(name, {})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return response
+
+
+def _in_stock(products: list[dict]) -> list[int]:
+    # Sold-out products can be browsed but not bought.
+    return [product["id"] for product in products if product["stock"] > 0]
+
+
+class Shopper:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, token: str, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.seen: list[int] = []
+
+    async def _call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self.recorder.call(self.client, name, method, url, **kwargs)
+
+    async def browse(self) -> None:
+        response = await self._call("GET /products", "GET", "/products", params={"limit": 20})
+        listing = response.json() if response.status_code == 200 else []
+        category = self.rng.choice(list(NOUNS))
+        response = await self._call(
+            "GET /products?category", "GET", "/products", params={"category": category, "limit": 20}
+        )
+        if response.status_code == 200:
+            listing += response.json()
+        low = self.rng.randrange(0, 400)
+        await self._call(
+            "GET /products?filters",
+            "GET",
+            "/products",
+            params={
+                "category": category,
+                "min_price": low,
+                "max_price": low + 100,
+                "in_stock": "true",
+                "sort": self.rng.choice(["price_asc", "rating"]),
+                "limit": 20,
+            },
+        )
+        for product in self.rng.sample(listing, min(2, len(listing))):
+            await self._call("GET /products/{id}", "GET", f"/products/{product['id']}")
+        if listing:
+            product_id = self.rng.choice(listing)["id"]
+            await self._call("GET /products/{id}/reviews", "GET", f"/products/{product_id}/reviews")
+        self.seen = _in_stock(listing)
+
+    async def search(self) -> None:
+        noun = self.rng.choice(self.rng.choice(list(NOUNS.values())))
+        q = f"{self.rng.choice(WORDS)} {noun.split()[0]}"
+        response = await self._call("GET /products/search", "GET", "/products/search", params={"q": q, "limit": 20})
+        if response.status_code == 200:
+            self.seen = _in_stock(response.json()) + self.seen
+
+    async def checkout(self) -> None:
+        if not self.seen:
+            response = await self._call("GET /products", "GET", "/products", params={"limit": 20})
+            self.seen = _in_stock(response.json()) if response.status_code == 200 else []
+        for product_id in self.rng.sample(self.seen, min(2, len(self.seen))):
+            await self._call(
+                "POST /cart/items",
+                "POST",
+                "/cart/items",
+                json={"product_id": product_id, "quantity": self.rng.randint(1, 2)},
+                headers=self.headers,
+            )
+        await self._call("GET /cart", "GET", "/cart", headers=self.headers)
+        await self._call("POST /orders", "POST", "/orders", json=ORDER_BODY, headers=self.headers)
+
+    async def run(self, scenario: str) -> None:
+        if scenario in ("shop", "browse"):
+            await self.browse()
+        if scenario in ("shop", "search"):
+            await self.search()
+        if scenario in ("shop", "checkout"):
+            await self.checkout()
+
+
+def _percentile(ordered: list[float], p: float) -> float:
+    """Linear interpolation between closest ranks, as numpy's default."""
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * p
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _summary(samples: list[float], elapsed: float, statuses: dict[int, int] | None = None) -> dict:
+    ordered = sorted(samples)
+    summary = {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+    if statuses is not None:
+        summary["errors"] = sum(count for code, count in statuses.items() if code >= 400)
+        summary["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    return summary
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(base_url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                if (await client.get("/products/categories")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start in time")
+
+
+async def _drive(client: httpx.AsyncClient, tokens: list[str]) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    shoppers = [
+        Shopper(client, recorder, token, random.Random(ARGS.seed * 100003 + i)) for i, token in enumerate(tokens)
+    ]
+
+    async def session(shopper: Shopper, iterations: int) -> None:
+        for _ in range(iterations):
+            await shopper.run(ARGS.scenario)
+
+    await asyncio.gather(*(session(shopper, ARGS.warmup) for shopper in shoppers))
+    recorder.recording = True
+    start = time.perf_counter()
+    await asyncio.gather(*(session(shopper, ARGS.iterations) for shopper in shoppers))
+    return recorder, time.perf_counter() - start
+
+
+async def _run(tokens: list[str]) -> tuple[Recorder, float]:
+    if ARGS.mode == "inprocess":
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            outcome = await _drive(client, tokens)
+        if async_engine is not None:
+            # Close pooled connections while their event loop is still running.
+            await async_engine.dispose()
+        return outcome
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "backend.app.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(ARGS.workers),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        await _wait_until_up(base_url, process)
+        limits = httpx.Limits(max_connections=ARGS.virtual_users, max_keepalive_connections=ARGS.virtual_users)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+            return await _drive(client, tokens)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Endpoints whose p95 grew, or whose throughput fell, by more than tolerance."""
+    regressions = []
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if previous["throughput_rps"] and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s"
+            )
+    return regressions
+
+
+def main() -> int:
+    if ARGS.users < ARGS.virtual_users:
+        sys.exit("--users must be at least --virtual-users: every shopper needs a cart of their own")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seeded = seed(db, ARGS.users, ARGS.products, ARGS.reviews, ARGS.orders, seed=ARGS.seed)
+    finally:
+        db.close()
+    # Migrations, indexes and search structures, once, before any worker starts.
+    on_startup()
+    tokens = [auth.create_access_token(subject=email) for email in seeded.user_emails[:ARGS.virtual_users]]
+
+    recorder, elapsed = asyncio.run(_run(tokens))
+
+    all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+    all_statuses: dict[int, int] = {}
+    for statuses in recorder.statuses.values():
+        for code, count in statuses.items():
+            all_statuses[code] = all_statuses.get(code, 0) + count
+    report = {
+        "scenario": ARGS.scenario,
+        "mode": ARGS.mode,
+        "workers": ARGS.workers if ARGS.mode == "uvicorn" else 1,
+        "database": engine.dialect.name,
+        "database_async": async_engine is not None,
+        "virtual_users": ARGS.virtual_users,
+        "iterations": ARGS.iterations,
+        "seed": ARGS.seed,
+        "data": {
+            "users": ARGS.users,
+            "products": ARGS.products,
+            "reviews": seeded.reviews,
+            "orders": seeded.orders,
+        },
+        "python": platform.python_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "elapsed_s": round(elapsed, 4),
+        "scenarios_per_sec": round(ARGS.virtual_users * ARGS.iterations / elapsed, 2),
+        "total": _summary(all_samples, elapsed, all_statuses),
+        "endpoints": {
+            name: _summary(samples, elapsed, recorder.statuses[name])
+            for name, samples in sorted(recorder.samples.items())
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if ARGS.output:
+        with open(ARGS.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+    failed = report["total"]["errors"] > 0
+    if ARGS.baseline:
+        with open(ARGS.baseline) as file:
+            regressions = _compare(report, json.load(file), ARGS.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+SQL statement budget per endpoint.
+
+Seeds a throwaway SQLite database, calls each endpoint in-process and fails
+if it issues more statements than its budget. Budgets do not depend on how
+many rows are involved, so an N+1 shows up as soon as an order or cart has
+more than a handful of lines.
+
+Run from the project root:
+
+    python -m benchmarks.query_budget
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+_DB_DIR = tempfile.mkdtemp(prefix="shoppy-budget-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/budget.db"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from backend.app import models  # noqa: E402
+from backend.app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from backend.app.main import app  # noqa: E402
+
+
+LINES_PER_ORDER = 30
+PASSWORD = "Budget#Pass1"
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+# Requests run on the async engine when it is enabled; its events fire on the wrapped sync engine.
+REQUEST_ENGINE = async_engine.sync_engine if async_engine is not None else engine
+
+
+@contextmanager
+def count_statements():
+    counter = StatementCounter()
+    event.listen(REQUEST_ENGINE, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(REQUEST_ENGINE, "before_cursor_execute", counter)
+
+
+def _seed(client: TestClient) -> dict:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for i in range(LINES_PER_ORDER):
+            db.add(models.Product(name=f"Budget product {i}", price=1.0 + i, stock=1000))
+        db.commit()
+    finally:
+        db.close()
+
+    client.post("/auth/register", json={"email": "budget@example.com", "password": PASSWORD})
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.email == "budget@example.com").update({"is_admin": True})
+        db.commit()
+    finally:
+        db.close()
+    token = client.post("/auth/login", data={"username": "budget@example.com", "password": PASSWORD}).json()
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+
+def _fill_cart(client: TestClient, headers: dict) -> None:
+    for product_id in range(1, LINES_PER_ORDER + 1):
+        client.post("/cart/items", json={"product_id": product_id, "quantity": 1}, headers=headers)
+
+
+ORDER_BODY = {
+    "shipping_customer_name": "Budget",
+    "payment": {"cardholder_name": "Budget", "card_last4": "4242", "expiry_month": 1, "expiry_year": 2030},
+}
+
+
+# Reorder the 30-line order, then add, replace and remove a line.
+CART_BATCH = {
+    "reorder_order_id": 1,
+    "operations": [
+        {"op": "add", "product_id": 1, "quantity": 2},
+        {"op": "set", "product_id": 2, "quantity": 5},
+        {"op": "remove", "product_id": 3},
+    ],
+}
+
+
+def main() -> int:
+    client = TestClient(app)
+    headers = _seed(client)
+    _fill_cart(client, headers)
+    first_item, second_item = [item["id"] for item in client.get("/cart", headers=headers).json()["items"][:2]]
+
+    # (label, budget, request thunk). The request thunk returns the response.
+    # Filling the cart warmed the principal cache, so token checks cost no statement.
+    checks = [
+        ("GET /cart", 1, lambda: client.get("/cart", headers=headers)),
+        (
+            "POST /cart/items",
+            2,
+            lambda: client.post("/cart/items", json={"product_id": 1, "quantity": 1}, headers=headers),
+        ),
+        (
+            "PATCH /cart/items/{id}",
+            2,
+            lambda: client.patch(f"/cart/items/{first_item}", json={"quantity": 3}, headers=headers),
+        ),
+        ("DELETE /cart/items/{id}", 2, lambda: client.delete(f"/cart/items/{second_item}", headers=headers)),
+        ("POST /orders", 7, lambda: client.post("/orders", json=ORDER_BODY, headers=headers)),
+        ("GET /orders/{id}", 2, lambda: client.get("/orders/1", headers=headers)),
+        (
+            "PATCH /orders/{id}/status",
+            4,
+            lambda: client.patch("/orders/1/status", params={"status_value": "SHIPPED"}, headers=headers),
+        ),
+        ("GET /orders", 1, lambda: client.get("/orders", headers=headers)),
+        ("GET /orders/summary", 1, lambda: client.get("/orders/summary", headers=headers)),
+        ("POST /cart/batch", 6, lambda: client.post("/cart/batch", json=CART_BATCH, headers=headers)),
+        ("DELETE /cart", 1, lambda: client.delete("/cart", headers=headers)),
+    ]
+
+    failures = 0
+    for label, budget, call in checks:
+        with count_statements() as counter:
+            response = call()
+        ok = response.status_code < 400 and counter.count <= budget
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:<28} {counter.count:>3} statements (budget {budget}, HTTP {response.status_code})")
+        if not ok:
+            for statement in counter.statements:
+                print("       " + " ".join(statement.split())[:120])
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Query plan check for the product listing filters and sorts.
+
+Seeds a throwaway SQLite database (or --database-url), runs EXPLAIN on the
+statement GET /products builds for each filter/sort combination and fails if
+the plan does not use one of the expected indexes, or sorts rows that an
+index should have returned in order. Run it from the project root after
+changing listing queries or Product indexes:
+
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --database-url postgresql+psycopg2://postgres@localhost/bench_db
+
+PostgreSQL only picks these indexes over a sequential scan once the table is
+large enough, so seed a realistic number of --products there.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000, help="seeded products")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    return parser.parse_args(argv)
+
+
+ARGS = _parse_args(sys.argv[1:]) if __name__ == "__main__" else _parse_args([])
+os.environ["DATABASE_URL"] = ARGS.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='shoppy-plans-')}/plans.db"
+
+from sqlalchemy import text  # noqa: E402
+
+from backend.app.database import SessionLocal, engine  # noqa: E402
+from backend.app.migrations import migrate  # noqa: E402
+from backend.app.routers.products import listing_statement  # noqa: E402
+
+from .datagen import seed  # noqa: E402
+
+
+PAGE = 21  # limit + 1, as the endpoint fetches
+ONE = ["Electronics"]
+TWO = ["Electronics", "Books & Media"]
+
+# name -> (listing_statement arguments, indexes any of which the plan may use, whether it may sort)
+CASES = {
+    "newest": ({}, {"ix_products_created_at_id"}, False),
+    "newest, one category": ({"categories": ONE}, {"ix_products_category_created_id"}, False),
+    "newest, two categories": (
+        {"categories": TWO}, {"ix_products_created_at_id", "ix_products_category_created_id"}, True
+    ),
+    "newest, in stock": ({"in_stock": True}, {"ix_products_in_stock_created_id"}, False),
+    "newest, one category, in stock": (
+        {"categories": ONE, "in_stock": True}, {"ix_products_category_created_id"}, False
+    ),
+    # A narrow price range is cheaper to read through the price index and sort.
+    "newest, price range": (
+        {"min_price": 10, "max_price": 50}, {"ix_products_price_id", "ix_products_created_at_id"}, True
+    ),
+    "price ascending": ({"sort": "price_asc"}, {"ix_products_price_id"}, False),
+    "price descending": ({"sort": "price_desc"}, {"ix_products_price_id"}, False),
+    "price, one category": ({"sort": "price_desc", "categories": ONE}, {"ix_products_category_price_id"}, False),
+    "price, one category, price range": (
+        {"sort": "price_asc", "categories": ONE, "min_price": 10, "max_price": 50},
+        {"ix_products_category_price_id"},
+        False,
+    ),
+    "price, in stock": ({"sort": "price_asc", "in_stock": True}, {"ix_products_in_stock_price_id"}, False),
+    "price, in stock, price range": (
+        {"sort": "price_asc", "in_stock": True, "min_price": 10, "max_price": 50},
+        {"ix_products_in_stock_price_id"},
+        False,
+    ),
+    "rating": ({"sort": "rating"}, {"ix_products_rating_id"}, False),
+    "rating, next page": ({"sort": "rating", "after": [3.5, 100]}, {"ix_products_rating_id"}, False),
+    "price, next page": ({"sort": "price_asc", "after": [50.0, 100]}, {"ix_products_price_id"}, False),
+}
+
+
+def explain(statement) -> str:
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    if engine.dialect.name == "sqlite":
+        prefix, params = "EXPLAIN QUERY PLAN", tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        prefix, params = "EXPLAIN", compiled.params
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"{prefix} {compiled}", params).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _sorts(plan: str) -> bool:
+    if engine.dialect.name == "sqlite":
+        return "USE TEMP B-TREE FOR ORDER BY" in plan
+    return "Sort" in plan
+
+
+def main() -> int:
+    migrate(engine)
+    db = SessionLocal()
+    try:
+        seed(db, users=5, products=ARGS.products, reviews=ARGS.products // 2, orders=0)
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    failures = 0
+    for name, (arguments, indexes, may_sort) in CASES.items():
+        plan = explain(listing_statement(**arguments).limit(PAGE))
+        used = sorted(index for index in indexes if index in plan)
+        problems = []
+        if not used:
+            problems.append(f"expected one of {sorted(indexes)}")
+        if _sorts(plan) and not may_sort:
+            problems.append("sorts rows instead of reading them in index order")
+        status = "FAIL" if problems else "ok"
+        print(f"{status:4} {name:34} {', '.join(used) or '-'}")
+        if problems:
+            failures += 1
+            print("     " + "; ".join(problems))
+            print("     " + plan.replace("\n", "\n     "))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,7 @@ export function getToken() {
   return localStorage.getItem('shoppy_token');
 }
 
-export async function api(endpoint, options = {}) {
+async function request(endpoint, options = {}) {
   const url = endpoint.startsWith('http') ? endpoint : `${BASE_URL}${endpoint}`;
   const headers = {
     'Content-Type': 'application/json',
@@ -19,10 +19,21 @@ export async function api(endpoint, options = {}) {
     try { err.body = await res.json(); } catch { err.body = null; }
     throw err;
   }
+  return res;
+}
+
+export async function api(endpoint, options = {}) {
+  const res = await request(endpoint, options);
   if (res.status === 204) return null;
   return res.json();
 }
 
+// For paginated lists: the page plus the cursor for the next one (null on the last page).
+export async function apiPage(endpoint, options = {}) {
+  const res = await request(endpoint, options);
+  return { items: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+}
+
 export function apiForm(endpoint, formData, options = {}) {
   const url = endpoint.startsWith('http') ? endpoint : `${BASE_URL}${endpoint}`;
   const headers = {};
@@ -10,6 +10,7 @@ export default function Header() {
   const [search, setSearch] = useState('');
   const [cartCount, setCartCount] = useState(0);
   const [categories, setCategories] = useState([]);
+  const [suggestions, setSuggestions] = useState([]);
 
   useEffect(() => {
     api('/products/categories').then(setCategories).catch(() => {});
@@ -35,6 +36,20 @@ export default function Header() {
     return () => window.removeEventListener('cart-updated', onCartUpdated);
   }, [user]);
 
+  useEffect(() => {
+    const prefix = search.trim();
+    if (!prefix) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      api(`/products/suggest?q=${encodeURIComponent(prefix)}`)
+        .then(setSuggestions)
+        .catch(() => setSuggestions([]));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [search]);
+
   const handleSearch = (e) => {
     e.preventDefault();
     if (search.trim()) navigate(`/products?q=${encodeURIComponent(search.trim())}`);
@@ -55,7 +70,14 @@ export default function Header() {
               value={search}
               onChange={(e) => setSearch(e.target.value)}
               className="search-input"
+              list="search-suggestions"
+              autoComplete="off"
             />
+            <datalist id="search-suggestions">
+              {suggestions.map((s) => (
+                <option key={s.id} value={s.name} />
+              ))}
+            </datalist>
             <button type="submit" className="search-btn" title="Search" aria-label="Search">
               <svg className="search-icon" xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2" strokeLinecap="round" strokeLinejoin="round">
                 <circle cx="11" cy="11" r="8" />
@@ -1,17 +1,11 @@
 import { Link } from 'react-router-dom';
-
-const BASE = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
+import ProductImage from './ProductImage';
 
 export default function ProductCard({ product }) {
-  const imageUrl = product.image_url ? `${BASE}${product.image_url}` : null;
   return (
     <Link to={`/products/${product.id}`} className="product-card">
       <div className="product-card-image">
-        {imageUrl ? (
-          <img src={imageUrl} alt={product.name} />
-        ) : (
-          <div className="product-card-placeholder">No image</div>
-        )}
+        <ProductImage product={product} size="card" sizes="(max-width: 520px) 50vw, 240px" />
       </div>
       <div className="product-card-body">
         <h3>{product.name}</h3>
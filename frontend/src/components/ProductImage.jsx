@@ -0,0 +1,37 @@
+const BASE = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
+
+// Longest side of each server-built variant (backend/app/images.py).
+const VARIANT_WIDTHS = { thumb: 160, card: 480, detail: 1200 };
+
+function srcSet(variants, format, largest) {
+  return Object.entries(VARIANT_WIDTHS)
+    .filter(([name, width]) => width <= VARIANT_WIDTHS[largest] && variants[name])
+    .map(([name, width]) => `${BASE}${variants[name][format]} ${width}w`)
+    .join(', ');
+}
+
+/**
+ * Product photo. Uses the resized WebP/JPEG variants up to `size` when the
+ * API lists them, and falls back to the original image otherwise.
+ */
+export default function ProductImage({ product, size, sizes }) {
+  if (!product.image_url) {
+    return <div className="product-card-placeholder">No image</div>;
+  }
+  const variants = product.image_variants;
+  if (!variants) {
+    return <img src={`${BASE}${product.image_url}`} alt={product.name} loading="lazy" />;
+  }
+  return (
+    <picture>
+      <source type="image/webp" srcSet={srcSet(variants, 'webp', size)} sizes={sizes} />
+      <img
+        src={`${BASE}${variants[size].jpeg}`}
+        srcSet={srcSet(variants, 'jpeg', size)}
+        sizes={sizes}
+        alt={product.name}
+        loading="lazy"
+      />
+    </picture>
+  );
+}
@@ -0,0 +1,52 @@
+import { useState, useEffect } from 'react';
+import api from '../api';
+import ProductCard from './ProductCard';
+
+const STORAGE_KEY = 'shoppy_recently_viewed';
+const MAX_ITEMS = 12;
+
+function viewedIds() {
+  try {
+    const ids = JSON.parse(localStorage.getItem(STORAGE_KEY));
+    return Array.isArray(ids) ? ids : [];
+  } catch {
+    return [];
+  }
+}
+
+// Most recent first; called from the product page.
+export function recordView(productId) {
+  const id = Number(productId);
+  const ids = [id, ...viewedIds().filter((other) => other !== id)].slice(0, MAX_ITEMS);
+  localStorage.setItem(STORAGE_KEY, JSON.stringify(ids));
+}
+
+export default function RecentlyViewed() {
+  const [products, setProducts] = useState([]);
+
+  useEffect(() => {
+    const ids = viewedIds();
+    if (ids.length === 0) return;
+    // One request for every product, in viewing order; deleted products come back as missing.
+    api(`/products/batch?ids=${ids.join(',')}`)
+      .then(({ products: found, missing }) => {
+        setProducts(found);
+        if (missing.length) {
+          localStorage.setItem(STORAGE_KEY, JSON.stringify(ids.filter((id) => !missing.includes(id))));
+        }
+      })
+      .catch(() => {});
+  }, []);
+
+  if (products.length === 0) return null;
+  return (
+    <section className="section">
+      <h2>Recently viewed</h2>
+      <div className="product-grid">
+        {products.map((p) => (
+          <ProductCard key={p.id} product={p} />
+        ))}
+      </div>
+    </section>
+  );
+}
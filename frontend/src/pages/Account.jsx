@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
+import api from '../api';
 import { useAuth } from '../context/AuthContext';
 
 export default function Account() {
@@ -19,6 +20,12 @@ export default function Account() {
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
   const [deleting, setDeleting] = useState(false);
+  const [orderCounts, setOrderCounts] = useState(null);
+
+  useEffect(() => {
+    if (!user) return;
+    api('/orders/summary').then(setOrderCounts).catch(() => setOrderCounts(null));
+  }, [user]);
 
   const handleUpdate = async (e) => {
     e.preventDefault();
@@ -81,6 +88,19 @@ export default function Account() {
     <div className="account-page">
       <div className="account-page-inner">
         <h1 className="account-page-title">Account</h1>
+        {orderCounts && (
+          <div className="account-card account-orders-card">
+            <h2 className="account-section-title">Orders</h2>
+            <p className="account-orders-summary">
+              {orderCounts.total === 0
+                ? 'You have not placed any orders yet.'
+                : `${orderCounts.total} ${orderCounts.total === 1 ? 'order' : 'orders'} · ${
+                    orderCounts.counts.PENDING + orderCounts.counts.CONFIRMED + orderCounts.counts.SHIPPED
+                  } in progress · ${orderCounts.counts.DELIVERED} delivered`}
+            </p>
+            <Link to="/orders" className="order-view-link">View your orders</Link>
+          </div>
+        )}
         <div className="account-card">
         <h2 className="account-section-title">Profile</h2>
         <form onSubmit={handleUpdate} className="account-form">
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import api from '../api';
 import ProductCard from '../components/ProductCard';
+import RecentlyViewed from '../components/RecentlyViewed';
 
 export default function Home() {
   const [products, setProducts] = useState([]);
@@ -9,8 +10,8 @@ export default function Home() {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    api('/products')
-      .then((data) => setProducts(Array.isArray(data) ? data.slice(0, 12) : []))
+    api('/products?limit=12')
+      .then((data) => setProducts(Array.isArray(data) ? data : []))
       .catch((e) => setError(e.message || 'Failed to load products'))
       .finally(() => setLoading(false));
   }, []);
@@ -41,6 +42,7 @@ export default function Home() {
           </p>
         )}
       </section>
+      <RecentlyViewed />
     </div>
   );
 }
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { useParams, Link } from 'react-router-dom';
+import { useParams, Link, useNavigate } from 'react-router-dom';
 import api from '../api';
 
 function getExpectedDelivery(createdAt, days = 3) {
@@ -13,6 +13,9 @@ export default function OrderDetail() {
   const [order, setOrder] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [reordering, setReordering] = useState(false);
+  const [reorderError, setReorderError] = useState(null);
+  const navigate = useNavigate();
 
   useEffect(() => {
     api(`/orders/${id}`)
@@ -21,6 +24,22 @@ export default function OrderDetail() {
       .finally(() => setLoading(false));
   }, [id]);
 
+  const handleReorder = async () => {
+    setReordering(true);
+    setReorderError(null);
+    try {
+      await api('/cart/batch', {
+        method: 'POST',
+        body: JSON.stringify({ reorder_order_id: order.id }),
+      });
+      window.dispatchEvent(new CustomEvent('cart-updated'));
+      navigate('/cart');
+    } catch (e) {
+      setReorderError(e.body?.detail || 'Failed to add items to cart.');
+      setReordering(false);
+    }
+  };
+
   if (loading) return <p className="loading">Loading order…</p>;
   if (error || !order) return <p className="error">{error || 'Order not found'}</p>;
 
@@ -53,6 +72,10 @@ export default function OrderDetail() {
                 </li>
               ))}
             </ul>
+            <button type="button" className="order-detail-reorder" onClick={handleReorder} disabled={reordering}>
+              {reordering ? 'Adding…' : 'Buy again'}
+            </button>
+            {reorderError && <p className="error">{reorderError}</p>}
           </section>
         </div>
 
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import api from '../api';
+import api, { apiPage } from '../api';
 
 const ORDER_STATUS_FLOW = ['PENDING', 'CONFIRMED', 'SHIPPED', 'DELIVERED'];
 
@@ -47,24 +47,76 @@ function OrderStatusStepper({ status }) {
   );
 }
 
+const ORDER_STATUSES = [...ORDER_STATUS_FLOW, 'CANCELLED'];
+const PAGE_SIZE = 20;
+
+function ordersPath(statusFilter, cursor) {
+  const params = new URLSearchParams({ limit: PAGE_SIZE });
+  if (statusFilter) params.set('status', statusFilter);
+  if (cursor) params.set('cursor', cursor);
+  return `/orders?${params}`;
+}
+
 export default function Orders() {
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [summary, setSummary] = useState(null);
+  const [statusFilter, setStatusFilter] = useState('');
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    api('/orders')
-      .then((data) => setOrders(Array.isArray(data) ? data : []))
+    api('/orders/summary').then(setSummary).catch(() => setSummary(null));
+  }, []);
+
+  useEffect(() => {
+    setLoading(true);
+    apiPage(ordersPath(statusFilter))
+      .then(({ items, nextCursor: cursor }) => {
+        setOrders(Array.isArray(items) ? items : []);
+        setNextCursor(cursor);
+      })
       .catch((e) => setError(e.message || 'Failed to load orders'))
       .finally(() => setLoading(false));
-  }, []);
+  }, [statusFilter]);
+
+  const loadMore = () => {
+    setLoadingMore(true);
+    apiPage(ordersPath(statusFilter, nextCursor))
+      .then(({ items, nextCursor: cursor }) => {
+        setOrders((prev) => [...prev, ...items]);
+        setNextCursor(cursor);
+      })
+      .catch((e) => setError(e.message || 'Failed to load orders'))
+      .finally(() => setLoadingMore(false));
+  };
 
-  if (loading) return <p className="loading">Loading orders…</p>;
+  if (loading && orders.length === 0) return <p className="loading">Loading orders…</p>;
   if (error) return <p className="error">{error}</p>;
 
   return (
     <div className="orders-page">
       <h1 className="orders-page-title">Your orders</h1>
+      {summary && summary.total > 0 && (
+        <div className="orders-filters" role="group" aria-label="Filter orders by status">
+          {['', ...ORDER_STATUSES].map((value) => {
+            const count = value ? summary.counts[value] : summary.total;
+            if (value && !count) return null;
+            const label = value ? value.charAt(0) + value.slice(1).toLowerCase() : 'All';
+            return (
+              <button
+                key={value || 'all'}
+                type="button"
+                className={`orders-filter${statusFilter === value ? ' orders-filter--active' : ''}`}
+                onClick={() => setStatusFilter(value)}
+              >
+                {label} ({count})
+              </button>
+            );
+          })}
+        </div>
+      )}
       {orders.length === 0 ? (
         <p className="orders-empty">No orders yet.</p>
       ) : (
@@ -120,6 +172,11 @@ export default function Orders() {
           ))}
         </ul>
       )}
+      {nextCursor && (
+        <button type="button" className="reviews-load-more" onClick={loadMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading…' : 'Load more orders'}
+        </button>
+      )}
     </div>
   );
 }
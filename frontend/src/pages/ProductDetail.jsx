@@ -1,9 +1,9 @@
 import { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import api from '../api';
+import api, { apiPage } from '../api';
 import { useAuth } from '../context/AuthContext';
-
-const BASE = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
+import ProductImage from '../components/ProductImage';
+import { recordView } from '../components/RecentlyViewed';
 
 export default function ProductDetail() {
   const { id } = useParams();
@@ -21,20 +21,53 @@ export default function ProductDetail() {
   const [reviewError, setReviewError] = useState('');
   const [editingReviewId, setEditingReviewId] = useState(null);
   const [deletingReviewId, setDeletingReviewId] = useState(null);
+  const [reviewsCursor, setReviewsCursor] = useState(null);
+  const [loadingMoreReviews, setLoadingMoreReviews] = useState(false);
 
   useEffect(() => {
     api(`/products/${id}`)
-      .then(setProduct)
+      .then((data) => {
+        setProduct(data);
+        recordView(data.id);
+      })
       .catch((e) => setError(e.status === 404 ? 'Product not found' : e.message))
       .finally(() => setLoading(false));
   }, [id]);
 
+  // Rating aggregates change with every review write.
+  const refreshProduct = () => {
+    api(`/products/${id}`).then(setProduct).catch(() => {});
+  };
+
+  // First page of reviews, plus the user's own review when it is further down.
+  const loadReviews = async () => {
+    const { items, nextCursor } = await apiPage(`/products/${id}/reviews`);
+    let list = Array.isArray(items) ? items : [];
+    if (user && !list.some((r) => r.user_id === user.id)) {
+      const mine = await api(`/products/${id}/reviews?user_id=${user.id}&limit=1`);
+      list = [...mine, ...list];
+    }
+    setReviews(list);
+    setReviewsCursor(nextCursor);
+  };
+
   useEffect(() => {
     if (!id) return;
-    api(`/products/${id}/reviews`)
-      .then((data) => setReviews(Array.isArray(data) ? data : []))
-      .catch(() => setReviews([]));
-  }, [id]);
+    loadReviews().catch(() => setReviews([]));
+  }, [id, user]);
+
+  const loadMoreReviews = async () => {
+    setLoadingMoreReviews(true);
+    try {
+      const { items, nextCursor } = await apiPage(`/products/${id}/reviews?cursor=${encodeURIComponent(reviewsCursor)}`);
+      setReviews((prev) => [...prev, ...items.filter((r) => !prev.some((p) => p.id === r.id))]);
+      setReviewsCursor(nextCursor);
+    } catch {
+      // Keep the reviews already shown; the button stays available to retry.
+    } finally {
+      setLoadingMoreReviews(false);
+    }
+  };
 
   const handleAddToCart = async (e) => {
     e.preventDefault();
@@ -83,8 +116,8 @@ export default function ProductDetail() {
       });
       setReviewComment('');
       setReviewRating(5);
-      const data = await api(`/products/${id}/reviews`);
-      setReviews(Array.isArray(data) ? data : []);
+      await loadReviews();
+      refreshProduct();
     } catch (err) {
       const d = err.body?.detail;
       const raw = Array.isArray(d) ? d.map((x) => x.msg).join(' ') : (d || 'Failed to submit review.');
@@ -107,6 +140,7 @@ export default function ProductDetail() {
       });
       setReviews((prev) => prev.map((r) => (r.id === updated.id ? updated : r)));
       setEditingReviewId(null);
+      refreshProduct();
     } catch (err) {
       const d = err.body?.detail;
       const raw = Array.isArray(d) ? d.map((x) => x.msg).join(' ') : (d || 'Failed to update review.');
@@ -139,6 +173,7 @@ export default function ProductDetail() {
     try {
       await api(`/reviews/${reviewId}`, { method: 'DELETE' });
       setReviews((prev) => prev.filter((r) => r.id !== reviewId));
+      refreshProduct();
       if (editingReviewId === reviewId) setEditingReviewId(null);
       setReviewComment('');
       setReviewRating(5);
@@ -159,21 +194,20 @@ export default function ProductDetail() {
   if (loading) return <p className="loading">Loading…</p>;
   if (error || !product) return <p className="error">{error || 'Product not found'}</p>;
 
-  const imageUrl = product.image_url ? `${BASE}${product.image_url}` : null;
-
   return (
     <div className="product-detail">
       <div className="product-detail-main">
         <div className="product-detail-image">
-          {imageUrl ? (
-            <img src={imageUrl} alt={product.name} />
-          ) : (
-            <div className="product-card-placeholder">No image</div>
-          )}
+          <ProductImage product={product} size="detail" sizes="(max-width: 700px) 100vw, 50vw" />
         </div>
         <div className="product-detail-info">
           <h1>{product.name}</h1>
           <p className="product-detail-category">{product.category || '—'}</p>
+          {product.rating_count > 0 && (
+            <p className="product-detail-rating">
+              {product.average_rating.toFixed(1)}★ · {product.rating_count} {product.rating_count === 1 ? 'rating' : 'ratings'}
+            </p>
+          )}
           <p className="product-detail-price">${Number(product.price).toFixed(2)}</p>
           {product.description && <p className="product-detail-desc">{product.description}</p>}
           <form onSubmit={handleAddToCart} className="add-to-cart-form">
@@ -280,6 +314,11 @@ export default function ProductDetail() {
             </li>
           ))}
         </ul>
+        {reviewsCursor && (
+          <button type="button" className="reviews-load-more" onClick={loadMoreReviews} disabled={loadingMoreReviews}>
+            {loadingMoreReviews ? 'Loading…' : 'Load more reviews'}
+          </button>
+        )}
         {user && !myReview && (
           <form onSubmit={handleSubmitReview} className="review-form">
             <h3>Add a review</h3>
@@ -4,28 +4,46 @@ import api from '../api';
 import ProductCard from '../components/ProductCard';
 
 export default function Products() {
-  const [searchParams] = useSearchParams();
+  const [searchParams, setSearchParams] = useSearchParams();
   const category = searchParams.get('category');
   const q = searchParams.get('q');
+  const sort = searchParams.get('sort') || 'newest';
+  const minPrice = searchParams.get('min_price') || '';
+  const maxPrice = searchParams.get('max_price') || '';
+  const inStock = searchParams.get('in_stock') === 'true';
   const [products, setProducts] = useState([]);
-  const [categories, setCategories] = useState([]);
+  const [facets, setFacets] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
     setLoading(true);
     setError(null);
+    const params = new URLSearchParams();
+    if (category) params.set('category', category);
+    if (sort !== 'newest') params.set('sort', sort);
+    if (minPrice) params.set('min_price', minPrice);
+    if (maxPrice) params.set('max_price', maxPrice);
+    if (inStock) params.set('in_stock', 'true');
     const promise = q
       ? api(`/products/search?q=${encodeURIComponent(q)}`)
-      : api(category ? `/products?category=${encodeURIComponent(category)}` : '/products');
+      : api(`/products?${params}`);
     promise
       .then((data) => setProducts(Array.isArray(data) ? data : []))
       .catch((e) => setError(e.message || 'Failed to load products'))
       .finally(() => setLoading(false));
-  }, [category, q]);
+  }, [category, q, sort, minPrice, maxPrice, inStock]);
+
+  // Filters live in the URL, so they survive reloads and can be shared.
+  const setFilter = (name, value) => {
+    const next = new URLSearchParams(searchParams);
+    if (value) next.set(name, value);
+    else next.delete(name);
+    setSearchParams(next);
+  };
 
   useEffect(() => {
-    api('/products/categories').then(setCategories).catch(() => {});
+    api('/products/facets').then(setFacets).catch(() => {});
   }, []);
 
   return (
@@ -35,16 +53,46 @@ export default function Products() {
       </h1>
       <div className="categories-bar">
         <Link to="/products" className={!category && !q ? 'active' : ''}>All</Link>
-        {categories.map((c) => (
+        {facets.map((f) => (
           <Link
-            key={c.value}
-            to={`/products?category=${encodeURIComponent(c.value)}`}
-            className={category === c.value ? 'active' : ''}
+            key={f.category}
+            to={`/products?category=${encodeURIComponent(f.category)}`}
+            className={category === f.category ? 'active' : ''}
+            title={
+              f.product_count
+                ? `${f.in_stock_count} in stock · $${f.min_price.toFixed(2)}–$${f.max_price.toFixed(2)}`
+                : undefined
+            }
           >
-            {c.label}
+            {f.category} <span className="category-count">{f.product_count}</span>
           </Link>
         ))}
       </div>
+      {!q && (
+        <div className="products-filters">
+          <label>
+            Sort
+            <select value={sort} onChange={(e) => setFilter('sort', e.target.value === 'newest' ? '' : e.target.value)}>
+              <option value="newest">Newest</option>
+              <option value="price_asc">Price: low to high</option>
+              <option value="price_desc">Price: high to low</option>
+              <option value="rating">Top rated</option>
+            </select>
+          </label>
+          <label>
+            Min $
+            <input type="number" min="0" value={minPrice} onChange={(e) => setFilter('min_price', e.target.value)} />
+          </label>
+          <label>
+            Max $
+            <input type="number" min="0" value={maxPrice} onChange={(e) => setFilter('max_price', e.target.value)} />
+          </label>
+          <label className="products-filters-check">
+            <input type="checkbox" checked={inStock} onChange={(e) => setFilter('in_stock', e.target.checked ? 'true' : '')} />
+            In stock only
+          </label>
+        </div>
+      )}
       {loading && <p className="loading">Loading…</p>}
       {error && <p className="error">{error}</p>}
       {!loading && !error && products.length === 0 && (